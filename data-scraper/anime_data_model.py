@@ -1,7 +1,16 @@
-TOTAL_MANGA = 20965 # mangas with rating
+TOTAL_MANGA = 20965 # mangas with rating, used when no manga_rank_index.MangaRankIndex has been built
 # last manga https://myanimelist.net/manga/12200/High_School_Musical
 
+# The models use __slots__ to stay small when thousands of shows are loaded from the
+# snapshot history. Derived metrics are computed on first use and cached in a slot.
+
 class Anime:
+    # MAL API fields read from anime_data (id and title are always returned)
+    FIELDS = ('num_favorites', 'statistics', 'mean', 'source')
+
+    __slots__ = ('id', 'title', 'favourites', 'p2w', 'watching', 'completed', 'dropped', 'rating', 'source',
+                 '_favourites_per_100_p2w', '_drop_rate')
+
     def __init__(self, anime_data) -> None:
         """
         anime_data - data of the anime from MAL API
@@ -15,64 +24,153 @@ class Anime:
         completed - number of users who have completed the anime
         rating - rating of the anime
         """
-        self.id = anime_data['id']
-        self.title = anime_data['title']
-        self.favourites =int(anime_data['num_favorites'])
-        self.p2w = int(anime_data['statistics']['status']['plan_to_watch'])
-        self.watching = int(anime_data['statistics']['status']['watching'])
-        self.completed = int(anime_data['statistics']['status']['completed'])
-        self.dropped = int(anime_data['statistics']['status']['dropped'])
-        self.rating = anime_data.get("mean") or -1
-        self.source = anime_data.get('source')
+        self._set_anime(
+            anime_data['id'],
+            anime_data['title'],
+            int(anime_data['num_favorites']),
+            int(anime_data['statistics']['status']['plan_to_watch']),
+            int(anime_data['statistics']['status']['watching']),
+            int(anime_data['statistics']['status']['completed']),
+            int(anime_data['statistics']['status']['dropped']),
+            anime_data.get("mean") or -1,
+            anime_data.get('source')
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Builds an anime from a stored row, e.g. a SnapshotStore snapshot,
+        without going back through the MAL API payload format.
+        """
+        anime = cls.__new__(cls)
+        anime._set_anime_row(row)
+        return anime
+
+    def _set_anime(self, anime_id, title, favourites, p2w, watching, completed, dropped, rating, source) -> None:
+        self.id = anime_id
+        self.title = title
+        self.favourites = favourites
+        self.p2w = p2w
+        self.watching = watching
+        self.completed = completed
+        self.dropped = dropped
+        self.rating = rating
+        self.source = source
+        self._favourites_per_100_p2w = None
+        self._drop_rate = None
+
+    def _set_anime_row(self, row) -> None:
+        self._set_anime(
+            row['anime_id'],
+            row['title'],
+            row['num_favorites'] or 0,
+            row['plan_to_watch'] or 0,
+            row['watching'] or 0,
+            row['completed'] or 0,
+            row['dropped'] or 0,
+            row['mean'] or -1,
+            row['source']
+        )
 
     def favourites_per_100_p2w(self) -> float:
-        return self.favourites / self.p2w * 100
+        if self._favourites_per_100_p2w is None:
+            self._favourites_per_100_p2w = self.favourites / self.p2w * 100 if self.p2w else 0.0
+        return self._favourites_per_100_p2w
 
     def get_mal_link(self) -> str:
         return f"https://myanimelist.net/anime/{self.id}"
 
     def get_drop_rate(self) -> float:
-        total = self.dropped + self.completed + self.watching
-        if total == 0:
-            return 0.0
-        return self.dropped / total * 100
+        if self._drop_rate is None:
+            total = self.dropped + self.completed + self.watching
+            self._drop_rate = self.dropped / total * 100 if total else 0.0
+        return self._drop_rate
 
     def __repr__(self) -> str:
         return f"{self.title}"
 
 class AdaptedAnime(Anime):
+    # MAL API fields read from manga_data
+    MANGA_FIELDS = ('num_favorites', 'mean', 'num_list_users', 'rank', 'media_type')
+
+    __slots__ = ('manga_id', 'manga_favourite', 'manga_score', 'manga_num_list_users', 'manga_rank', 'manga_type',
+                 'total_manga', '_manga_percentile', '_favourite_to_num_list_users')
 
-    def __init__(self, anime_data, manga_data) -> None:
+    def __init__(self, anime_data, manga_data, total_manga: int = TOTAL_MANGA) -> None:
         """
-        manga_data - data of the manga from MAL API
+        manga_data - data of the manga from MAL API (or its MangaRankIndex entry)
+        total_manga - number of manga with a score, e.g. MangaRankIndex.total
 
         manga_id - ID of the manga in MyAnimeList
         manga_favourite - number of users who have favorited the manga
         manga_score - mean score of the manga
         manga_num_list_users - number of users who have added the manga to their list
-        manga_rank - rank of the manga
+        manga_rank - rank of the manga, -1 if it is unranked
         """
         super().__init__(anime_data)
-        self.manga_id = manga_data['id']
-        self.manga_favourite = manga_data['num_favorites']
-        self.manga_score = manga_data.get('mean') or 0
-        self.manga_num_list_users = manga_data['num_list_users']
-        self.manga_rank = manga_data['rank']
-        self.manga_type = manga_data['media_type']
+        self._set_manga(
+            manga_data['id'],
+            manga_data['num_favorites'],
+            manga_data.get('mean') or 0,
+            manga_data['num_list_users'],
+            manga_data.get('rank') or -1,
+            manga_data['media_type'],
+            total_manga
+        )
+
+    @classmethod
+    def from_rows(cls, anime_row, manga_row, total_manga: int = TOTAL_MANGA):
+        """
+        Builds an adaptation from a stored anime row and manga row, e.g. SnapshotStore snapshots.
+        """
+        adapted_anime = cls.__new__(cls)
+        adapted_anime._set_anime_row(anime_row)
+        adapted_anime._set_manga(
+            manga_row['manga_id'],
+            manga_row['num_favorites'] or 0,
+            manga_row['mean'] or 0,
+            manga_row['num_list_users'] or 0,
+            manga_row['rank'] or -1,
+            manga_row['media_type'],
+            total_manga
+        )
+        return adapted_anime
+
+    def _set_manga(self, manga_id, favourite, score, num_list_users, rank, manga_type, total_manga) -> None:
+        self.manga_id = manga_id
+        self.manga_favourite = favourite
+        self.manga_score = score
+        self.manga_num_list_users = num_list_users
+        self.manga_rank = rank
+        self.manga_type = manga_type
+        self.total_manga = total_manga
+        self._manga_percentile = None
+        self._favourite_to_num_list_users = None
 
     def get_manga_percentile(self) -> float:
-        if self.manga_score <= 0:
-            return -1
-        return (1 - self.manga_rank / TOTAL_MANGA) * 100
+        if self._manga_percentile is None:
+            if self.manga_score <= 0 or self.manga_rank <= 0:
+                self._manga_percentile = -1
+            else: # a rank past total_manga, e.g. from an older count, is the bottom
+                self._manga_percentile = min(max((1 - self.manga_rank / self.total_manga) * 100, 0), 100)
+        return self._manga_percentile
 
     def get_manga_link(self) -> str:
         return f"https://myanimelist.net/manga/{self.manga_id}"
 
     def get_favourite_to_num_list_users(self) -> float:
-        return self.manga_favourite / self.manga_num_list_users * 100
+        if self._favourite_to_num_list_users is None:
+            self._favourite_to_num_list_users = \
+                self.manga_favourite / self.manga_num_list_users * 100 if self.manga_num_list_users else 0.0
+        return self._favourite_to_num_list_users
 
 
 class SequelAnime(Anime):
+    # MAL API fields read from prequel_data
+    PREQUEL_FIELDS = Anime.FIELDS + ('start_season',)
+
+    __slots__ = ('prequel', 'sequel_type', 'season', 'prequel_airing')
+
     def __init__(self, anime_data, prequel_data, sequel_type: str, season: int) -> None:
         """
         prequel_data - data of the prequel from MAL API
@@ -83,4 +181,18 @@ class SequelAnime(Anime):
         self.prequel = Anime(prequel_data)
         self.sequel_type = sequel_type
         self.season = season
-        self.prequel_airing = prequel_data['start_season']['season'] + str(prequel_data['start_season']['year']) # move this to anime
\ No newline at end of file
+        self.prequel_airing = prequel_data['start_season']['season'] + str(prequel_data['start_season']['year']) # move this to anime
+
+    @classmethod
+    def from_rows(cls, anime_row, prequel_row, sequel_type: str = -1, season="unknown"):
+        """
+        Builds a sequel from stored anime and prequel rows, e.g. SnapshotStore snapshots,
+        whose start_season is stored as season + year (e.g. fall2020).
+        """
+        sequel_anime = cls.__new__(cls)
+        sequel_anime._set_anime_row(anime_row)
+        sequel_anime.prequel = Anime.from_row(prequel_row)
+        sequel_anime.sequel_type = sequel_type
+        sequel_anime.season = season
+        sequel_anime.prequel_airing = prequel_row['start_season']
+        return sequel_anime
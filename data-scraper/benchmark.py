@@ -0,0 +1,171 @@
+"""
+offline benchmark of the three scraper pipelines.
+
+Runs season_scraper, main_season and scraper_based_on_anime_type end to end against a
+mock_mal_server, each in its own process with a scratch data directory, and reports
+the requests sent, wall time, peak memory and instrumentation stages of each. Results can be
+saved and compared with a previous run to catch fetch-layer regressions.
+
+run python benchmark.py [--latency 0.02] [--throttle-rate 0.05] [--save baseline.json]
+then python benchmark.py --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from statistics import median
+from mock_mal_server import MockMALServer
+
+PIPELINES = ('season_scraper', 'main_season', 'scraper_based_on_anime_type')
+RESULT_PREFIX = "BENCHMARK_RESULT "
+DEFAULT_TOLERANCE = 0.25 # how much slower than the baseline a pipeline may get
+
+
+def get_peak_memory() -> float:
+    """
+    Returns the peak resident memory of this process in MB, or -1 where it cannot be read.
+    """
+    try:
+        import resource
+    except ImportError:
+        return -1
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_child(pipeline: str) -> None:
+    """
+    Runs one pipeline in this process and prints its measurements as the last line.
+    """
+    import instrumentation
+    import mal_client
+
+    module = __import__(pipeline)
+    instrumentation.reset()
+    module.main()
+    mal_client.close()
+
+    result = instrumentation.report()
+    result['peak_memory_mb'] = get_peak_memory()
+    result['stages'] = {name: stage['seconds'] for name, stage in result['stages'].items()}
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def run_pipeline(pipeline: str, base_url: str, rate_limit: float, use_cache: bool) -> dict:
+    """
+    Runs a pipeline in a fresh process with its own scratch data directory.
+
+    Returns:
+    dict: The measurements printed by the child process.
+    """
+    with tempfile.TemporaryDirectory() as workspace:
+        os.makedirs(os.path.join(workspace, "data"))
+        env = dict(
+            os.environ,
+            CLIENT_ID="benchmark",
+            MAL_BASE_URL=base_url,
+            MAL_DATA_DIR=os.path.join(workspace, "data"),
+            MAL_RATE_LIMIT=str(rate_limit),
+            MAL_CACHE="1" if use_cache else "0",
+            MAL_METRICS="off",
+            PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+        )
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", pipeline],
+            cwd=workspace, env=env, capture_output=True, text=True, encoding="utf-8", errors="replace"
+        )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"{pipeline} failed:\n{completed.stderr[-2000:]}")
+
+
+def run_benchmark(pipelines=PIPELINES, repeat: int = 1, rate_limit: float = 0, use_cache: bool = False, **server_options) -> dict:
+    """
+    Runs every pipeline against one mock server.
+
+    Parameters:
+    pipelines: The pipelines to run.
+    repeat: How many times each pipeline is run. The run with the median wall time is reported.
+    rate_limit: MAL_RATE_LIMIT of the pipelines. 0 turns the client-side limit off.
+    use_cache: Whether the pipelines may use the response cache (empty at the start of each run).
+    server_options: Options of the MockMALServer, e.g. latency or throttle_rate.
+
+    Returns:
+    dict: The measurements by pipeline.
+    """
+    results = {}
+    with MockMALServer(**server_options) as mock:
+        for pipeline in pipelines:
+            runs = sorted((run_pipeline(pipeline, mock.base_url, rate_limit, use_cache) for _ in range(repeat)),
+                          key=lambda run: run['wall_time'])
+            results[pipeline] = runs[len(runs) // 2]
+            results[pipeline]['wall_times'] = [run['wall_time'] for run in runs]
+    return results
+
+
+def print_report(results: dict) -> None:
+    print(f"{'pipeline':<30}{'requests':>9}{'retries':>9}{'wall s':>9}{'peak MB':>9}  stages (s)")
+    for pipeline, result in results.items():
+        stages = ", ".join(f"{stage} {seconds:.2f}" for stage, seconds in result['stages'].items())
+        print(f"{pipeline:<30}{result['requests']:>9}{result['retries']:>9}{result['wall_time']:>9.2f}"
+              f"{result['peak_memory_mb']:>9.1f}  {stages}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Returns the regressions against a baseline: more requests, or a wall time more than
+    tolerance slower (by the median of the repeated runs).
+    """
+    regressions = []
+    for pipeline, result in results.items():
+        if pipeline not in baseline:
+            continue
+        before = baseline[pipeline]
+        if result['requests'] > before['requests']:
+            regressions.append(f"{pipeline}: {before['requests']} -> {result['requests']} requests")
+        if median(result['wall_times']) > median(before['wall_times']) * (1 + tolerance):
+            regressions.append(f"{pipeline}: {median(before['wall_times']):.2f}s -> {median(result['wall_times']):.2f}s")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the scrapers against a local mock of the MAL API.")
+    parser.add_argument("pipelines", nargs="*", help=f"pipelines to run, default: {' '.join(PIPELINES)}")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per pipeline, the median is reported")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds each mock response is delayed by")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--payload-size", type=int, default=0, help="padding characters added to every payload")
+    parser.add_argument("--season-size", type=int, default=60, help="number of shows in the mock season")
+    parser.add_argument("--rate-limit", type=float, default=0, help="client-side requests per second, 0 for none")
+    parser.add_argument("--cache", action="store_true", help="let the pipelines use the response cache")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results saved in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown against --compare")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        sys.exit()
+    unknown = [pipeline for pipeline in args.pipelines if pipeline not in PIPELINES]
+    if unknown:
+        parser.error(f"unknown pipeline {', '.join(unknown)}, expected one of {', '.join(PIPELINES)}")
+
+    results = run_benchmark(
+        args.pipelines or PIPELINES, args.repeat, args.rate_limit, args.cache,
+        latency=args.latency, throttle_rate=args.throttle_rate, payload_size=args.payload_size, season_size=args.season_size
+    )
+    print_report(results)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
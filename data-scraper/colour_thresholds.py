@@ -0,0 +1,168 @@
+"""
+colour scale thresholds calibrated on past seasons.
+
+The red, yellow and green points of the typed sheets' colour scales are quantiles
+of each metric over the pre-season statistics of the shows of past seasons in the
+lineups of the snapshot history, per category. Shows whose season has not ended yet,
+such as the ones being rated, are left out. Every metric of every category is computed in one
+nanquantile pass. The thresholds are cached in data/colour_thresholds.json and
+recomputed once older than MAX_AGE; a metric with fewer than MIN_SHOWS values, or
+whose values are all alike, keeps the thresholds written in its Column.
+
+run python colour_thresholds.py to recompute them now.
+"""
+
+import copy
+import json
+import os
+import warnings
+from datetime import datetime, timedelta
+import numpy as np
+import mal_client
+from anime_data_model import TOTAL_MANGA
+from manga_rank_index import MangaRankIndex
+from prediction_model import get_pre_season_frame
+from snapshot_store import SnapshotStore
+
+DEFAULT_PATH = os.path.join(mal_client.DATA_DIR, "colour_thresholds.json")
+MAX_AGE = timedelta(days=float(os.getenv("MAL_THRESHOLDS_MAX_AGE_DAYS", 7)))
+QUANTILES = (0.1, 0.5, 0.9) # red, yellow and green
+MIN_SHOWS = 10
+
+
+def positive(values: np.ndarray) -> np.ndarray:
+    """
+    Returns the values with NaN for the unknown ones, e.g. the -1 or 0 of an unrated show.
+    """
+    return np.where(values > 0, values, np.nan)
+
+
+# the calibrated metric of each coloured column, by category and column header
+METRICS = {
+    'original': {
+        'P2W': lambda frame: frame['p2w'],
+    },
+    'adaptation': {
+        'Favourites': lambda frame: frame['favourites'],
+        'P2W': lambda frame: frame['p2w'],
+        'M_#Users': lambda frame: frame['manga_num_list_users'],
+        'M_Favs': lambda frame: frame['manga_favourite'],
+        'M_Score': lambda frame: positive(frame['manga_score']),
+        'M_%ile': lambda frame: np.where(frame.manga_percentile() >= 0, frame.manga_percentile(), np.nan),
+    },
+    'sequel': {
+        'P2W': lambda frame: frame['p2w'],
+        'P Completed': lambda frame: frame['prequel_completed'],
+        'P Rating': lambda frame: positive(frame['prequel_rating']),
+    },
+}
+
+
+def compute_thresholds(frames: dict, quantiles: tuple = QUANTILES, min_shows: int = MIN_SHOWS) -> dict:
+    """
+    Computes the colour scale thresholds of every metric in METRICS.
+
+    The metrics are padded with NaN into one matrix, so a single nanquantile call
+    covers every category.
+
+    Parameters:
+    frames: The SeasonFrame of the past shows of each category.
+    quantiles: The quantiles of the start, mid and end of a colour scale.
+    min_shows: The number of known values a metric needs to be calibrated.
+
+    Returns:
+    dict[str, dict[str, list]]: The (start, mid, end) thresholds by column header, by category.
+    """
+    keys, columns = [], []
+    for category, metrics in METRICS.items():
+        if category in frames:
+            for header, metric in metrics.items():
+                keys.append((category, header))
+                columns.append(np.asarray(metric(frames[category]), dtype=float))
+    num_rows = max((len(column) for column in columns), default=0)
+    if not num_rows:
+        return {}
+
+    matrix = np.full((num_rows, len(columns)), np.nan)
+    for i, column in enumerate(columns):
+        matrix[:len(column), i] = column
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # metrics without any value
+        cutoffs = np.nanquantile(matrix, quantiles, axis=0)
+    counts = np.count_nonzero(~np.isnan(matrix), axis=0)
+
+    thresholds = {}
+    for (category, header), count, values in zip(keys, counts, cutoffs.T):
+        if count >= min_shows and values[0] < values[-1]: # a flat scale would colour nothing apart
+            thresholds.setdefault(category, {})[header] = [round(float(value), 2) for value in values]
+    return thresholds
+
+
+class ColourThresholds:
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        """
+        path - JSON file the thresholds are cached in
+
+        thresholds - (start, mid, end) by column header, by category
+        computed_at - when the thresholds were computed, None if they never were
+        """
+        self.path = path
+        self.thresholds = {}
+        self.computed_at = None
+        if os.path.exists(path):
+            with open(path) as file:
+                cached = json.load(file)
+            self.thresholds = cached['thresholds']
+            self.computed_at = datetime.fromisoformat(cached['computed_at'])
+
+    def is_stale(self, max_age: timedelta = MAX_AGE) -> bool:
+        return self.computed_at is None or datetime.now() - self.computed_at > max_age
+
+    def refresh(self, store: SnapshotStore = None, force: bool = False, max_age: timedelta = MAX_AGE, total_manga: int = TOTAL_MANGA) -> bool:
+        """
+        Recomputes the thresholds from the past seasons in the snapshot history if they are older than max_age.
+
+        Parameters:
+        store: The snapshot history. Defaults to the scrapers' store.
+        force: Recompute even if the thresholds are recent.
+        max_age: How old the thresholds may get before they are recomputed.
+        total_manga: The number of manga with a score the manga percentiles are relative to.
+
+        Returns:
+        bool: Whether the thresholds were recomputed.
+        """
+        if not force and not self.is_stale(max_age):
+            return False
+        store = store or SnapshotStore()
+        frames = {
+            category: get_pre_season_frame(store, category, total_manga=total_manga, ended_by=datetime.now())[0]
+            for category in METRICS
+        }
+        self.thresholds = compute_thresholds(frames)
+        self.computed_at = datetime.now()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, 'w') as file:
+            json.dump({'computed_at': self.computed_at.isoformat(timespec='seconds'), 'thresholds': self.thresholds}, file, indent=2)
+        return True
+
+    def apply(self, columns: list, category: str) -> list:
+        """
+        Returns the columns of a category's sheet with their colour scales set to the calibrated thresholds.
+        Columns without calibrated thresholds are returned unchanged.
+        """
+        calibrated = self.thresholds.get(category, {})
+        applied = []
+        for column in columns:
+            if column.colour_scale and column.header in calibrated:
+                column = copy.copy(column)
+                column.colour_scale = tuple(calibrated[column.header])
+            applied.append(column)
+        return applied
+
+
+if __name__ == "__main__":
+    thresholds = ColourThresholds()
+    thresholds.refresh(force=True, total_manga=MangaRankIndex().total or TOTAL_MANGA)
+    for category, headers in thresholds.thresholds.items():
+        for header, (start, mid, end) in headers.items():
+            print(f"{category} {header}: {start} / {mid} / {end}")
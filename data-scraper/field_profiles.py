@@ -0,0 +1,55 @@
+"""
+named field profiles for MAL requests.
+
+Each profile is derived from the fields the model classes in anime_data_model
+actually read, so a request only asks for the payload its caller consumes.
+status is always requested as the response cache uses it to pick a TTL, and
+start_season for every show a scraper records, as prediction_model dates its
+pre-season snapshots by it.
+"""
+
+from anime_data_model import Anime, AdaptedAnime, SequelAnime
+from response_cache import split_fields
+
+
+def join_fields(*groups) -> str:
+    """
+    Joins groups of field names into a comma separated fields parameter, without duplicates.
+    """
+    return ",".join(dict.fromkeys(field for group in groups for field in group))
+
+
+def merge_fields(*fields) -> str:
+    """
+    Returns the smallest fields parameter covering every given one.
+    """
+    return join_fields(*(sorted(split_fields(field)) for field in fields))
+
+
+def covers(fields: str, required: str) -> bool:
+    """
+    Returns whether a response fetched with fields contains everything in required.
+    """
+    return split_fields(required) <= split_fields(fields)
+
+
+ANIME = join_fields(Anime.FIELDS, ('start_season', 'status'))
+PREQUEL = join_fields(SequelAnime.PREQUEL_FIELDS, ('status',))
+# season_scraper filters on media_type and reads related_anime; start_date lets the relation graph order the shows
+# and alternative_titles feed the title index
+SEASON = join_fields(Anime.FIELDS, ('related_anime', 'media_type', 'start_date', 'start_season', 'alternative_titles', 'status'))
+MANGA = join_fields(AdaptedAnime.MANGA_FIELDS, ('status',))
+# relation_classifier walks the relation edges of a show and compares candidate prequels by start date
+CLASSIFY = join_fields(Anime.FIELDS, ('related_anime', 'related_manga', 'media_type', 'start_date', 'start_season', 'status'))
+PREQUEL_CANDIDATE = join_fields(SequelAnime.PREQUEL_FIELDS, ('related_anime', 'media_type', 'start_date', 'status'))
+MANGA_CANDIDATE = join_fields(AdaptedAnime.MANGA_FIELDS, ('alternative_titles', 'status'))
+
+PROFILES = {
+    'anime': ANIME,
+    'prequel': PREQUEL,
+    'season': SEASON,
+    'manga': MANGA,
+    'classify': CLASSIFY,
+    'prequel_candidate': PREQUEL_CANDIDATE,
+    'manga_candidate': MANGA_CANDIDATE,
+}
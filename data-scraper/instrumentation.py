@@ -0,0 +1,111 @@
+"""
+per-stage timing and logging shared by every scraper run.
+
+Stages (network, decode, models, render, save) are timed with stage(), from any
+thread; time spent in fetch threads is summed, so network can exceed the wall time.
+At the end of a run, report_run() prints a compact summary with the mal_client
+counters, writes it as JSON, or does nothing, depending on MAL_METRICS:
+    summary (default), off, or the path of a JSON file.
+
+Payloads are logged at DEBUG level; set MAL_LOG_LEVEL=DEBUG to see them.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("MAL_LOG_LEVEL", "WARNING").upper()
+METRICS = os.getenv("MAL_METRICS", "summary")
+STAGES = ('network', 'decode', 'models', 'render', 'save')
+
+_lock = threading.Lock()
+_started = time.perf_counter()
+timings = {} # stage -> [seconds, calls]
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Sets up leveled logging for the scrapers, e.g. DEBUG to log every fetched payload.
+    """
+    logging.basicConfig(level=level, format="%(levelname)s %(name)s: %(message)s")
+
+
+def reset() -> None:
+    """
+    Clears the stage timings and restarts the wall clock.
+    """
+    global _started
+    with _lock:
+        timings.clear()
+        _started = time.perf_counter()
+
+
+def add_time(name: str, seconds: float, calls: int = 1) -> None:
+    with _lock:
+        timing = timings.setdefault(name, [0.0, 0])
+        timing[0] += seconds
+        timing[1] += calls
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Adds the time spent in the with block to a stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - start)
+
+
+def report() -> dict:
+    """
+    Returns the wall time, the time and calls of each stage and the mal_client counters of the run.
+    """
+    import mal_client # imported late so this module stays importable on its own
+
+    stats = dict(mal_client.stats)
+    looked_up = stats['cache_hits'] + stats['cache_misses']
+    with _lock:
+        stages = {name: {'seconds': round(seconds, 4), 'calls': calls} for name, (seconds, calls) in timings.items()}
+    return {
+        'wall_time': round(time.perf_counter() - _started, 4),
+        'stages': {name: stages[name] for name in sorted(stages, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES))},
+        'requests': stats['requests'],
+        'bytes_received': stats['bytes_received'],
+        'retries': stats['retries'],
+        'throttled': stats['throttled'],
+        'rate_limit_wait': round(stats['rate_limit_wait'], 4),
+        'cache_hit_rate': round(stats['cache_hits'] / looked_up, 4) if looked_up else None,
+    }
+
+
+def format_summary(run: dict) -> str:
+    stages = ", ".join(f"{name} {stage['seconds']:.2f}s" for name, stage in run['stages'].items())
+    cache = f"{run['cache_hit_rate']:.0%} cache hits" if run['cache_hit_rate'] is not None else "no cache"
+    return (
+        f"{run['wall_time']:.2f}s | {run['requests']} requests, {run['bytes_received'] / 1024:.0f} KiB, "
+        f"{run['retries']} retries, {cache} | {stages}"
+    )
+
+
+def report_run(metrics: str = METRICS) -> dict:
+    """
+    Reports the run as configured by MAL_METRICS: a one line summary, a JSON file or nothing.
+
+    Returns:
+    dict: The report.
+    """
+    run = report()
+    if metrics == "off":
+        return run
+    if metrics.endswith(".json"):
+        with open(metrics, 'w') as file:
+            json.dump(run, file, indent=2)
+    else:
+        print(format_summary(run))
+    return run
@@ -1,148 +1,175 @@
 """
 FAL season scraper
 
-Current set for Spring 2024
+The tracked shows and the picked ones are read from tracked_shows.json, see tracker.py
 """
 
+import argparse
 import datetime
-import requests
-from openpyxl import Workbook
-from openpyxl.comments import Comment
-from openpyxl.styles import Alignment, Font
-from openpyxl.utils import get_column_letter
-from dotenv import load_dotenv
+import logging
 import os
+import mal_client
+import instrumentation
+from snapshot_store import SnapshotStore
+from title_index import TitleIndex
+from tracker import CONFIG_PATH, load_config
+import field_profiles
+from sheet_writer import Column, create_workbook, render_sheet
 from anime_data_model import Anime
 
-load_dotenv()
-CLIENT_ID = os.getenv("CLIENT_ID")
-FIELDS = "mean,num_favorites,statistics,source,related_anime,media_type"
-
-PICKED_SHOWS = [
-    "Bleach: Sennen Kessen-hen - Soukoku-tan",
-    "Ao no Hako",
-    "Dungeon ni Deai wo Motomeru no wa Machigatteiru Darou ka V: Houjou no Megami-hen",
-    "Kimi wa Meido-sama.",
-    "Kekkon suru tte, Hontou desu ka",
-    "Arifureta Shokugyou de Sekai Saikyou Season 3",
-    "Dragon Ball Daima",
-    "Natsume Yuujinchou Shichi"
-]
+logger = logging.getLogger(__name__)
+
+FIELDS = field_profiles.ANIME
+TRACKED_METRICS = ('watching', 'dropped', 'completed', 'num_favorites', 'plan_to_watch', 'mean')
+# the tracker and the other scrapers record snapshots too, so deltas are taken over a fixed period
+# rather than since the last snapshot
+DELTA_PERIOD = datetime.timedelta(days=7)
 
 def fetch_anime_data(anime_id: int, field: str):
-    url = f'https://api.myanimelist.net/v2/anime/{anime_id}?fields={field}'
-    response = requests.get(url, headers={'X-MAL-CLIENT-ID': CLIENT_ID})
-    response.raise_for_status()
-    anime_data = response.json()
-    response.close()
-    try:
-        print(anime_data)
-    except:
-        print("can't print")
+    # tracking needs the current numbers, not a cached response
+    anime_data = mal_client.fetch_anime_data(anime_id, field, use_cache=False)
+    logger.debug("%s", anime_data)
     return anime_data
 
 def create_anime(anime_id):
     anime_data = fetch_anime_data(anime_id, FIELDS)
 
-    anime = Anime(anime_data)
+    with instrumentation.stage('models'):
+        anime = Anime(anime_data)
     return anime
 
-def create_sheet(workbook, anime_list):
-    TITLE = 1
-    WATCHING = 2
-    SCORE = 3
-    DROPPED = 4
-    FAVOURITE = 5
-    P2W = 6
-    DROP_RATE = 7
-    COMPLETED = 8
-
-    headers = ['Title', 'Watching', 'Score', 'Dropped', 'Favourite', 'P2W', 'Drop Rate', 'Completed']
-    sheet = workbook.active
-
-    for i, header in enumerate(headers):
-        sheet.cell(1, i+1).value = header
-        sheet.cell(1, i+1).alignment = Alignment(horizontal='center')
-        sheet.cell(1, i+1).font = Font(bold=True)
-        sheet.freeze_panes = 'B2'
-
-    for j, anime in enumerate(anime_list):
-        sheet.cell(j+2, TITLE).value = anime.title
-
-        sheet.cell(j+2, WATCHING).value = anime.watching
-        sheet.cell(j+2, SCORE).value = anime.rating
-        sheet.cell(j+2, DROPPED).value = anime.dropped
-        sheet.cell(j+2, FAVOURITE).value = anime.favourites
-        sheet.cell(j+2, P2W).value = anime.p2w
-        sheet.cell(j+2, DROP_RATE).value = anime.get_drop_rate()
-        sheet.cell(j+2, COMPLETED).value = anime.completed
-
-        sheet.cell(j+2, TITLE).hyperlink = anime.get_mal_link()
-        sheet[get_column_letter(DROP_RATE) + '1'].comment = Comment("Dropped/(Dropped+Watching+Completed)", "Author")
-        if anime.title in PICKED_SHOWS:
-            sheet.cell(j+2, TITLE).font = Font(bold=True)
-
-def main():
-    # ids = [50869, 54233, 56768, 55102, 39894, 56738, 54309, 48418, 56165, 52196, 57623, 50713, 53410, 57798, 51859, 55855, 57946, 54758, 51122, 53407, 53835, 53516, 53434, 56923, 55265, 56690, 53912, 55717, 57100, 55877, 52588, 53770, 55597, 53865, 55911, 56838, 57031, 55194, 54859, 56980, 52405, 54900, 56230, 54199, 58080, 51461, 54839, 57391, 53356, 57614]
-    ids = [
-        59131,
-        56967,
-        56784,
-        58516,
-        57635,
-        57066,
-        58572,
-        58511,
-        57559,
-        53287,
-        55570,
-        50306,
-        52995,
-        56400,
-        55823,
-        57102,
-        56894,
-        53033,
-        57554,
-        55994,
-        57181,
-        57611,
-        55887,
-        56228,
-        56964,
-        57891,
-        55071,
-        54853,
-        55150,
-        54726,
-        57944,
-        58445,
-        57362,
-        52215,
-        56647,
-        58714,
-        56843,
-        58172,
-        57360,
-        57796,
-        57533,
-        53723,
-        56420,
-        56662,
-        58173,
-        56461
+def get_stats(anime) -> tuple:
+    """
+    Returns the tracked statistics of an anime, in the order of TRACKED_METRICS.
+    """
+    rating = anime.rating if anime.rating != -1 else None
+    return (anime.watching, anime.dropped, anime.completed, anime.favourites, anime.p2w, rating)
+
+def get_deltas(anime, previous) -> tuple:
+    """
+    Returns (Δwatching, Δdropped, Δscore) since the baseline snapshot of the anime.
+    """
+    delta_score = None
+    if anime.rating != -1 and previous['mean'] is not None:
+        delta_score = round(anime.rating - previous['mean'], 2)
+    return (anime.watching - previous['watching'], anime.dropped - previous['dropped'], delta_score)
+
+def get_unfinished_ids(ids, previous_snapshots):
+    """
+    Returns the IDs of the anime that had not finished airing at their last snapshot.
+    """
+    return [
+        anime_id for anime_id in ids
+        if previous_snapshots[anime_id] is None or previous_snapshots[anime_id]['status'] != 'finished_airing'
     ]
-    anime_list = [create_anime(anime_id) for anime_id in ids]
 
-    workbook = Workbook()
+def get_changes(anime_list, previous_snapshots, baseline_snapshots):
+    """
+    Keeps the anime whose statistics changed since their last snapshot.
+
+    Parameters:
+    anime_list: The freshly fetched anime.
+    previous_snapshots: The last snapshot of each anime by id, or None if it was never recorded.
+    baseline_snapshots: The snapshot of each anime by id the deltas are taken from, or None
+        to take them from the last snapshot, e.g. while the history is shorter than DELTA_PERIOD.
+
+    Returns:
+    tuple[list[Anime], dict[int, tuple]]: The changed anime, and their deltas by anime id.
+        Anime seen for the first time count as changed and have no deltas.
+    """
+    changed_list = []
+    deltas = {}
+    for anime in anime_list:
+        previous = previous_snapshots[anime.id]
+        if previous is None:
+            changed_list.append(anime)
+        elif get_stats(anime) != tuple(previous[metric] for metric in TRACKED_METRICS):
+            changed_list.append(anime)
+            deltas[anime.id] = get_deltas(anime, baseline_snapshots[anime.id] or previous)
+    return changed_list, deltas
+
+def get_columns(picked_shows=()):
+    """
+    Returns the columns of the sheet, with the titles of the picked shows in bold.
+    """
+    return [
+        Column('Title', lambda anime: anime.title, link=lambda anime: anime.get_mal_link(), bold=lambda anime: anime.title in picked_shows),
+        Column('Watching', lambda anime: anime.watching),
+        Column('Score', lambda anime: anime.rating),
+        Column('Dropped', lambda anime: anime.dropped),
+        Column('Favourite', lambda anime: anime.favourites),
+        Column('P2W', lambda anime: anime.p2w),
+        Column('Drop Rate', lambda anime: anime.get_drop_rate(), "Dropped/(Dropped+Watching+Completed)"),
+        Column('Completed', lambda anime: anime.completed),
+    ]
 
-    create_sheet(workbook, anime_list)
+def get_delta_columns(deltas):
+    """
+    Returns the ΔWatching, ΔDropped and ΔScore columns, read from deltas by anime id.
+    """
+    return [
+        Column(header, lambda anime, i=i: deltas[anime.id][i] if anime.id in deltas else None)
+        for i, header in enumerate(['ΔWatching', 'ΔDropped', 'ΔScore'])
+    ]
 
+def create_sheet(workbook, anime_list, deltas=None, picked_shows=()):
+    columns = get_columns(picked_shows)
+    if deltas is not None:
+        columns += get_delta_columns(deltas)
+    render_sheet(workbook, "Sheet", columns, anime_list)
+
+def main(incremental=False, skip_finished=False, config_path=CONFIG_PATH):
+    """
+    Fetches the tracked anime and writes their statistics to a timestamped workbook.
+
+    Parameters:
+    incremental: Only write the anime whose statistics changed since the last run, with their deltas over DELTA_PERIOD.
+    skip_finished: Skip anime that had finished airing on the last run.
+    config_path: The JSON file with the tracked ids, the picked shows and the season name.
+    """
+    config = load_config(config_path)
+    ids = config['ids']
+    # keep the statistics of every fetched show in the local history
+    store = SnapshotStore()
+    mal_client.subscribe(store.record)
+    mal_client.subscribe(TitleIndex().record)
+
+    # read before fetching, as every fetch records a new snapshot
     now = datetime.datetime.now()
+    latest_snapshots = store.latest_snapshots(ids)
+    previous_snapshots = {anime_id: latest_snapshots.get(anime_id) for anime_id in ids}
+    if skip_finished:
+        ids = get_unfinished_ids(ids, previous_snapshots)
+    # the newest snapshot from before the period, whichever scraper recorded it
+    period_start = store.latest_snapshots(ids, before=(now - DELTA_PERIOD).strftime("%Y-%m-%d %H:%M:%S"))
+    baseline_snapshots = {anime_id: period_start.get(anime_id) for anime_id in ids}
+
+    anime_list = mal_client.fetch_concurrently(create_anime, ids)
+
+    deltas = None
+    if incremental:
+        anime_list, deltas = get_changes(anime_list, previous_snapshots, baseline_snapshots)
+        if not anime_list:
+            print("No tracked show changed since the last run")
+            instrumentation.report_run()
+            return
+
+    workbook = create_workbook()
+
+    create_sheet(workbook, anime_list, deltas, config['picked_shows'])
+
     timestamp = now.strftime("%Y-%m-%d-%H-%M")
-    data_dir = "data"
-    filename = os.path.join(data_dir, f"FAL_Fall_2024_data_{timestamp}.xlsx")
-    workbook.save(filename)
+    name = "delta" if incremental else "data"
+    filename = os.path.join(mal_client.DATA_DIR, f"FAL_{config['season'].replace(' ', '_')}_{name}_{timestamp}.xlsx")
+    with instrumentation.stage('save'):
+        workbook.save(filename)
+    instrumentation.report_run()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Writes the statistics of the tracked FAL shows to a workbook.")
+    parser.add_argument("--incremental", action="store_true", help="only write shows whose statistics changed since the last run, with their deltas over the last week")
+    parser.add_argument("--skip-finished", action="store_true", help="skip shows that had finished airing on the last run")
+    parser.add_argument("--config", default=CONFIG_PATH, help="JSON file with the tracked ids")
+    args = parser.parse_args()
+    instrumentation.configure_logging()
+    main(args.incremental, args.skip_finished, args.config)
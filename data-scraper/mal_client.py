@@ -0,0 +1,331 @@
+"""
+shared MyAnimeList API client used by every scraper.
+
+All requests go through one pooled, keep-alive requests.Session so a full
+season run reuses a handful of connections instead of opening one per lookup.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+from response_cache import ResponseCache
+import instrumentation
+
+load_dotenv()
+CLIENT_ID = os.getenv("CLIENT_ID")
+
+BASE_URL = os.getenv("MAL_BASE_URL", "https://api.myanimelist.net/v2") # e.g. a mock_mal_server
+POOL_SIZE = int(os.getenv("MAL_POOL_SIZE", 8))
+KEEP_ALIVE = os.getenv("MAL_KEEP_ALIVE", "1") != "0"
+MAX_WORKERS = int(os.getenv("MAL_MAX_WORKERS", POOL_SIZE))
+RATE_LIMIT = float(os.getenv("MAL_RATE_LIMIT", 3)) # requests per second
+MAX_RETRIES = int(os.getenv("MAL_MAX_RETRIES", 6))
+BACKOFF_BASE = 1.0 # seconds
+BACKOFF_MAX = 60.0 # seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DATA_DIR = os.getenv("MAL_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+CACHE_MAX_BYTES = int(float(os.getenv("MAL_CACHE_MAX_MB", 200)) * 1024 * 1024)
+
+_session = None
+_session_lock = threading.Lock()
+
+rate_limiter = TokenBucket(RATE_LIMIT, burst=POOL_SIZE)
+cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+subscribers = [] # called with (endpoint, payload) after every anime/manga fetched from the API
+_stats_lock = threading.Lock()
+stats = {
+    'requests': 0,
+    'throttled': 0, # 429 responses
+    'server_errors': 0, # 5xx responses
+    'connection_errors': 0,
+    'retries': 0,
+    'bytes_received': 0,
+    'rate_limit_wait': 0.0, # seconds spent waiting on the rate limiter
+    'cache_hits': 0,
+    'cache_misses': 0,
+}
+
+
+def _count(key: str, amount=1) -> None:
+    with _stats_lock:
+        stats[key] += amount
+
+
+def subscribe(callback) -> None:
+    """
+    Registers a function called with (endpoint, payload) for every anime or manga
+    fetched from the API. Responses served from the cache are not reported.
+    """
+    subscribers.append(callback)
+
+
+def unsubscribe(callback) -> None:
+    subscribers.remove(callback)
+
+
+def reset_stats() -> None:
+    """
+    Sets every request counter back to zero.
+    """
+    with _stats_lock:
+        for key in stats:
+            stats[key] = type(stats[key])()
+
+
+def create_session(pool_size: int = POOL_SIZE, keep_alive: bool = KEEP_ALIVE) -> requests.Session:
+    """
+    Creates a session with a connection pool mounted for the MAL API.
+
+    Parameters:
+    pool_size: The number of connections kept open to the API host.
+    keep_alive: Whether connections are reused between requests.
+
+    Returns:
+    requests.Session: The configured session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers['X-MAL-CLIENT-ID'] = CLIENT_ID or ""
+    session.headers['Connection'] = "keep-alive" if keep_alive else "close"
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the session shared by every fetcher, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def close() -> None:
+    """
+    Closes the shared session and its pooled connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get(path: str, params: dict = None) -> dict:
+    """
+    Sends a GET request to the MAL API through the shared session.
+
+    Parameters:
+    path: The endpoint path, relative to BASE_URL.
+    params: The query parameters.
+
+    Returns:
+    dict: The decoded JSON response.
+
+    Requests are spaced by the shared rate limiter. Throttled (429), 5xx and
+    connection failures are retried with jittered exponential backoff, waiting
+    at least as long as the API asks for in Retry-After.
+    The time spent on the response and on decoding it is added to the network
+    and decode stages of instrumentation.
+    """
+    url = path if path.startswith("http") else f"{BASE_URL}/{path}"
+    for attempt in range(MAX_RETRIES + 1):
+        _count('rate_limit_wait', rate_limiter.acquire())
+        _count('requests')
+        delay = backoff_delay(attempt, BACKOFF_BASE, BACKOFF_MAX)
+        try:
+            with instrumentation.stage('network'):
+                response = get_session().get(url, params=params)
+            with response:
+                _count('bytes_received', len(response.content))
+                if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    response.raise_for_status()
+                    with instrumentation.stage('decode'):
+                        return response.json()
+                if response.status_code == 429:
+                    _count('throttled')
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    delay = max(delay, retry_after)
+                    rate_limiter.pause(delay)
+                else:
+                    _count('server_errors')
+        except (requests.ConnectionError, requests.Timeout):
+            _count('connection_errors')
+            if attempt == MAX_RETRIES:
+                raise
+        _count('retries')
+        time.sleep(delay)
+
+
+def fetch_resource(endpoint: str, resource_id: int, fields: str, use_cache: bool = None) -> dict:
+    """
+    Fetches a single anime or manga, serving it from the on-disk cache while it is fresh.
+
+    Parameters:
+    endpoint: The resource type (anime or manga).
+    resource_id: The ID of the resource to fetch.
+    fields: The fields to fetch for the resource.
+    use_cache: Whether to read from and write to the response cache. Defaults to the MAL_CACHE setting at the time of the call.
+
+    Returns:
+    dict: The data for the resource from the MyAnimeList API.
+    """
+    if use_cache is None:
+        use_cache = os.getenv("MAL_CACHE", "1") != "0"
+    if use_cache:
+        cached = cache.get(endpoint, resource_id, fields)
+        if cached is not None:
+            _count('cache_hits')
+            return cached
+        _count('cache_misses')
+    data = get(f"{endpoint}/{resource_id}", {'fields': fields})
+    if use_cache:
+        cache.put(endpoint, resource_id, fields, data)
+    for callback in subscribers:
+        callback(endpoint, data)
+    return data
+
+
+def fetch_anime_data(anime_id: int, fields: str, use_cache: bool = None) -> dict:
+    """
+    Fetches the data for a given anime from the MyAnimeList API.
+
+    Parameters:
+    anime_id: The ID of the anime to fetch.
+    fields: The fields to fetch for the anime.
+    use_cache: Whether a fresh cached response may be returned instead.
+
+    Returns:
+    dict: The data for the anime from the MyAnimeList API.
+    """
+    return fetch_resource("anime", anime_id, fields, use_cache)
+
+
+def fetch_manga_data(manga_id: int, fields: str, use_cache: bool = None) -> dict:
+    """
+    Fetches the data for a given manga from the MyAnimeList API.
+
+    Parameters:
+    manga_id: The ID of the manga to fetch.
+    fields: The fields to fetch for the manga.
+    use_cache: Whether a fresh cached response may be returned instead.
+
+    Returns:
+    dict: The data for the manga from the MyAnimeList API.
+    """
+    return fetch_resource("manga", manga_id, fields, use_cache)
+
+
+def search_manga(query: str, fields: str, limit: int = 10) -> list:
+    """
+    Searches the MyAnimeList manga database (which includes novels and light novels) by title.
+
+    Parameters:
+    query: The title to search for. Only the first 64 characters are sent.
+    fields: The fields to fetch for each result.
+    limit: The maximum number of results.
+
+    Returns:
+    list[dict]: The matching manga, best match first.
+    """
+    data = get("manga", {'q': query[:64], 'limit': limit, 'fields': fields})
+    return [manga['node'] for manga in data['data']]
+
+
+def iter_season(year: int, season: str, limit: int, fields: str = ""):
+    """
+    Iterates over every anime in a given season, following the paging.next links.
+
+    Parameters:
+    year: The year of the season.
+    season: The season (spring, summer, fall, winter).
+    limit: The number of entries fetched per page.
+    fields: The listing-level fields to include in each node, e.g. media_type.
+
+    Yields:
+    dict: The node of each anime in the season listing.
+    """
+    params = {'limit': limit}
+    if fields:
+        params['fields'] = fields
+    page = get(f"anime/season/{year}/{season}", params)
+    while True:
+        for anime in page['data']:
+            yield anime['node']
+        next_url = page.get('paging', {}).get('next')
+        if not next_url:
+            return
+        page = get(next_url) # next already carries the query parameters
+
+
+def iter_manga_ranking(fields: str, ranking_type: str = "all", limit: int = 500):
+    """
+    Iterates over the MyAnimeList manga ranking, following the paging.next links.
+
+    Parameters:
+    fields: The fields to include in each node, e.g. num_list_users.
+    ranking_type: The ranking to page through (all, manga, novels, ...).
+    limit: The number of entries fetched per page (at most 500).
+
+    Yields:
+    dict: The node of each manga, best ranked first, with its rank added as ranking_rank.
+    """
+    page = get("manga/ranking", {'ranking_type': ranking_type, 'limit': limit, 'fields': fields})
+    while True:
+        for manga in page['data']:
+            yield dict(manga['node'], ranking_rank=manga['ranking']['rank'])
+        next_url = page.get('paging', {}).get('next')
+        if not next_url:
+            return
+        page = get(next_url)
+
+
+def fetch_concurrently(fetch, ids: list, max_workers: int = MAX_WORKERS) -> list:
+    """
+    Runs fetch for every id on a bounded thread pool.
+
+    Parameters:
+    fetch: The function called with each id.
+    ids: The ids to fetch.
+    max_workers: The maximum number of requests in flight. 1 fetches serially.
+
+    Returns:
+    list: The results of fetch, in the same order as ids.
+    """
+    if max_workers <= 1 or len(ids) <= 1:
+        return [fetch(item_id) for item_id in ids]
+    return list(iter_concurrently(fetch, ids, min(max_workers, len(ids))))
+
+
+def iter_concurrently(fetch, ids, max_workers: int = MAX_WORKERS):
+    """
+    Runs fetch for every id on a bounded thread pool, yielding results as soon as they are ready.
+    ids may be a generator; it is consumed lazily so at most 2 * max_workers results are held at once.
+
+    Parameters:
+    fetch: The function called with each id.
+    ids: The ids to fetch.
+    max_workers: The maximum number of requests in flight.
+
+    Yields:
+    The results of fetch, in the same order as ids.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pending = deque()
+        for item_id in ids:
+            pending.append(executor.submit(fetch, item_id))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
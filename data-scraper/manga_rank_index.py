@@ -0,0 +1,140 @@
+"""
+local index of the MAL manga ranking.
+
+The whole ranking is paged in bulk from the manga/ranking endpoint and stored in a
+SQLite database, refreshed once it is older than MAX_AGE. Lookups of the rank,
+percentile and list users of a manga are then dict lookups, and its ranking entry
+carries every field AdaptedAnime reads, so adaptations need no manga detail request.
+
+run python manga_rank_index.py to refresh the index now.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import mal_client
+import field_profiles
+
+DEFAULT_PATH = os.path.join(mal_client.DATA_DIR, "manga_ranking.sqlite3")
+MAX_AGE = timedelta(days=float(os.getenv("MAL_RANKING_MAX_AGE_DAYS", 7)))
+FIELDS = field_profiles.MANGA # the same as single manga fetches, so their payloads stay interchangeable
+COLUMNS = ('id', 'title', 'rank', 'mean', 'num_favorites', 'num_list_users', 'media_type')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manga_ranking (
+    manga_id INTEGER PRIMARY KEY,
+    title TEXT,
+    rank INTEGER,
+    mean REAL,
+    num_favorites INTEGER,
+    num_list_users INTEGER,
+    media_type TEXT
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class MangaRankIndex:
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        """
+        path - SQLite database file, created if it does not exist
+
+        entries - ranking entry of each manga by id, as a tuple in COLUMNS order
+        total - number of manga with a score, which the percentiles are relative to
+        refreshed_at - when the ranking was last fetched, None if it never was
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        self.entries = {row[0]: row for row in self.connection.execute("SELECT * FROM manga_ranking")}
+        self.total = sum(1 for entry in self.entries.values() if entry[3])
+        row = self.connection.execute("SELECT value FROM metadata WHERE key = 'refreshed_at'").fetchone()
+        self.refreshed_at = datetime.fromisoformat(row[0]) if row else None
+
+    def is_stale(self, max_age: timedelta = MAX_AGE) -> bool:
+        return self.refreshed_at is None or datetime.now() - self.refreshed_at > max_age
+
+    def refresh(self, force: bool = False, max_age: timedelta = MAX_AGE) -> bool:
+        """
+        Fetches the whole ranking again if the index is older than max_age.
+
+        Parameters:
+        force: Refresh even if the index is recent.
+        max_age: How old the index may get before it is refreshed.
+
+        Returns:
+        bool: Whether the ranking was fetched.
+        """
+        if not force and not self.is_stale(max_age):
+            return False
+        rows = [
+            (manga['id'], manga.get('title'), manga.get('rank') or manga['ranking_rank'], manga.get('mean'),
+             manga.get('num_favorites'), manga.get('num_list_users'), manga.get('media_type'))
+            for manga in mal_client.iter_manga_ranking(FIELDS)
+        ]
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM manga_ranking")
+            self.connection.executemany("INSERT OR REPLACE INTO manga_ranking VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata VALUES ('refreshed_at', ?)", (datetime.now().isoformat(timespec='seconds'),)
+            )
+            self._load()
+        return True
+
+    def __contains__(self, manga_id: int) -> bool:
+        return manga_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_rank(self, manga_id: int) -> int:
+        """
+        Returns the rank of a manga, or -1 if it is not in the ranking.
+        """
+        entry = self.entries.get(manga_id)
+        return entry[2] if entry else -1
+
+    def get_num_list_users(self, manga_id: int) -> int:
+        entry = self.entries.get(manga_id)
+        return entry[5] if entry else -1
+
+    def get_percentile(self, manga_id: int) -> float:
+        """
+        Returns the share of scored manga ranked below a manga, or -1 if it has no score.
+        """
+        entry = self.entries.get(manga_id)
+        if not entry or not entry[3] or not self.total:
+            return -1
+        return (1 - entry[2] / self.total) * 100
+
+    def get_payload(self, manga_id: int) -> dict:
+        """
+        Returns the ranking entry of a manga in the MAL API payload format read by AdaptedAnime,
+        or None if it is not in the ranking.
+        """
+        entry = self.entries.get(manga_id)
+        return dict(zip(COLUMNS, entry)) if entry else None
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    with MangaRankIndex() as index:
+        index.refresh(force=True)
+        print(f"{len(index)} manga ranked, {index.total} with a score")
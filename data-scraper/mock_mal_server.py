@@ -0,0 +1,301 @@
+"""
+local stand-in for the MAL API.
+
+Serves the anime, manga, anime/season, manga/ranking and manga search endpoints the
+scrapers use, so every pipeline can run without a CLIENT_ID or network. Responses are
+replayed from fixtures (fixtures/anime/<id>.json, fixtures/manga/<id>.json and
+fixtures/season/<year>_<season>.json, a list of anime ids) and generated
+deterministically for anything without one. Latency, 429 responses and payload size
+can be configured to exercise the fetch layer.
+
+run python mock_mal_server.py --port 8000, then point the scrapers at it with
+MAL_BASE_URL=http://127.0.0.1:8000/v2. Real responses can be recorded as fixtures with
+mal_client.subscribe(FixtureRecorder().record).
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SEASONS = ('winter', 'spring', 'summer', 'fall')
+SOURCES = ('manga', 'original', 'light_novel', 'web_manga', 'game')
+ALWAYS_RETURNED = ('id', 'title', 'main_picture') # the API returns these whatever the fields
+
+
+def get_season_ids(year: int, season: str, season_size: int) -> list:
+    """
+    Returns the ids of the generated shows of a season. Every season gets its own id range.
+    """
+    start = 100000 + ((year - 2000) * len(SEASONS) + SEASONS.index(season)) * 1000
+    return list(range(start, start + season_size))
+
+
+def generate_anime(anime_id: int) -> dict:
+    """
+    Generates a plausible anime payload. Odd ids are sequels of the previous id and
+    two thirds of the shows are adapted from a manga with the id manga_id = anime_id.
+    """
+    rng = random.Random(anime_id)
+    p2w = rng.randint(1000, 80000)
+    year = 2000 + anime_id % 25
+    anime_data = {
+        'id': anime_id,
+        'title': f"Anime {anime_id}",
+        'alternative_titles': {'en': f"Anime {anime_id} (English)", 'ja': "", 'synonyms': [f"A{anime_id}"]},
+        'start_date': f"{year}-{rng.randint(1, 12):02d}-01",
+        'start_season': {'year': year, 'season': rng.choice(SEASONS)},
+        'mean': round(rng.uniform(5.5, 9.0), 2),
+        'num_favorites': rng.randint(0, p2w // 20),
+        'media_type': 'tv' if anime_id % 7 else 'movie',
+        'status': rng.choice(('finished_airing', 'currently_airing', 'not_yet_aired')),
+        'source': SOURCES[anime_id % len(SOURCES)] if anime_id % 3 else 'original',
+        'statistics': {
+            'status': {
+                'watching': str(rng.randint(0, p2w)),
+                'completed': str(rng.randint(0, p2w * 2)),
+                'on_hold': str(rng.randint(0, p2w // 10)),
+                'dropped': str(rng.randint(0, p2w // 5)),
+                'plan_to_watch': str(p2w),
+            },
+            'num_list_users': p2w * 3,
+        },
+        'related_anime': [],
+        'related_manga': [],
+    }
+    if anime_id % 2:
+        anime_data['related_anime'].append(
+            {'node': {'id': anime_id - 1, 'title': f"Anime {anime_id - 1}"}, 'relation_type': 'prequel', 'relation_type_formatted': "Prequel"}
+        )
+    if anime_id % 3:
+        anime_data['related_manga'].append(
+            {'node': {'id': anime_id, 'title': f"Manga {anime_id}"}, 'relation_type': 'adaptation', 'relation_type_formatted': "Adaptation"}
+        )
+    return anime_data
+
+
+def generate_manga(manga_id: int) -> dict:
+    rng = random.Random(-manga_id)
+    num_list_users = rng.randint(100, 200000)
+    return {
+        'id': manga_id,
+        'title': f"Manga {manga_id}",
+        'alternative_titles': {'en': "", 'ja': "", 'synonyms': []},
+        'mean': round(rng.uniform(5.0, 9.2), 2),
+        'rank': rng.randint(1, 30000),
+        'num_list_users': num_list_users,
+        'num_favorites': rng.randint(0, num_list_users // 50),
+        'media_type': 'light_novel' if manga_id % 5 == 0 else 'manga',
+        'status': rng.choice(('finished', 'currently_publishing')),
+        'related_manga': [],
+    }
+
+
+class FixtureRecorder:
+    def __init__(self, directory: str = FIXTURES_DIR) -> None:
+        """
+        directory - where the fixtures are written, one JSON file per anime or manga
+        """
+        self.directory = directory
+
+    def record(self, endpoint: str, payload: dict) -> None:
+        """
+        Writes a fetched payload as a fixture, merged into the one already recorded.
+        Meant to be registered with mal_client.subscribe.
+        """
+        path = os.path.join(self.directory, endpoint, f"{payload['id']}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fixture = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                fixture = json.load(file)
+        fixture.update(payload)
+        with open(path, 'w', encoding="utf-8") as file:
+            json.dump(fixture, file, ensure_ascii=False)
+
+
+class MockMALServer:
+    def __init__(self, port: int = 0, fixtures_dir: str = FIXTURES_DIR, latency: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 0.0, payload_size: int = 0, season_size: int = 60, ranking_size: int = 2000, seed: int = 0) -> None:
+        """
+        port - port to listen on, 0 picks a free one
+        fixtures_dir - directory of recorded responses
+        latency - seconds each response is delayed by
+        throttle_rate - share of requests answered with 429 Too Many Requests
+        retry_after - Retry-After of the 429 responses, in seconds
+        payload_size - number of padding characters added to every anime and manga payload
+        season_size - number of shows in a generated season
+        ranking_size - number of manga in the manga ranking
+        seed - seed of the 429 injection
+        """
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.payload_size = payload_size
+        self.season_size = season_size
+        self.ranking_size = ranking_size
+        self.random = random.Random(seed)
+        self.fixtures = {}
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'bytes_sent': 0}
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), MockMALHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v2"
+
+    def start(self) -> str:
+        """
+        Serves in a background thread and returns the base URL to set as MAL_BASE_URL.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self.lock:
+            self.stats[key] += amount
+
+    def should_throttle(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.throttle_rate
+
+    def load_fixture(self, kind: str, name) -> object:
+        key = (kind, name)
+        if key not in self.fixtures:
+            path = os.path.join(self.fixtures_dir, kind, f"{name}.json")
+            fixture = None
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as file:
+                    fixture = json.load(file)
+            with self.lock:
+                self.fixtures[key] = fixture
+        return self.fixtures[key]
+
+    def get_anime(self, anime_id: int) -> dict:
+        return self.pad(dict(generate_anime(anime_id), **(self.load_fixture('anime', anime_id) or {})))
+
+    def get_manga(self, manga_id: int) -> dict:
+        return self.pad(dict(generate_manga(manga_id), **(self.load_fixture('manga', manga_id) or {})))
+
+    def get_season(self, year: int, season: str) -> list:
+        return self.load_fixture('season', f"{year}_{season}") or get_season_ids(year, season, self.season_size)
+
+    def pad(self, payload: dict) -> dict:
+        if self.payload_size:
+            payload['synopsis'] = ("Lorem ipsum dolor sit amet. " * (self.payload_size // 28 + 1))[:self.payload_size]
+        return payload
+
+
+def project(payload: dict, fields: str) -> dict:
+    """
+    Keeps the requested fields of a payload, as the API does.
+    """
+    requested = {field.strip() for field in fields.split(",")} | set(ALWAYS_RETURNED) | {'synopsis'}
+    return {key: value for key, value in payload.items() if key in requested}
+
+
+class MockMALHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real API
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        mock = self.server.mock
+        mock.count('requests')
+        if mock.latency:
+            time.sleep(mock.latency)
+        if mock.should_throttle():
+            mock.count('throttled')
+            return self.send_json(429, {'message': "", 'error': "too_many_requests"}, {'Retry-After': str(mock.retry_after)})
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+        fields = query.get('fields', "")
+        limit = int(query.get('limit', 100))
+        offset = int(query.get('offset', 0))
+
+        match = re.fullmatch(r"/v2/anime/season/(\d+)/(\w+)", path)
+        if match and match.group(2) in SEASONS:
+            anime_ids = mock.get_season(int(match.group(1)), match.group(2))
+            nodes = [{'node': project(mock.get_anime(anime_id), fields)} for anime_id in anime_ids[offset:offset + limit]]
+            return self.send_json(200, self.page(nodes, len(anime_ids), offset, limit, query))
+        if path == "/v2/manga/ranking":
+            nodes = [
+                {'node': project(dict(mock.get_manga(manga_id), rank=rank), fields), 'ranking': {'rank': rank}}
+                for rank, manga_id in enumerate(range(offset + 1, min(offset + limit, mock.ranking_size) + 1), start=offset + 1)
+            ]
+            return self.send_json(200, self.page(nodes, mock.ranking_size, offset, limit, query))
+        if path == "/v2/manga" and 'q' in query:
+            # the best match is a manga titled as the query, followed by unrelated results
+            manga_id = zlib.crc32(query['q'].encode()) % 1000000 + 1
+            matches = [dict(mock.get_manga(manga_id), title=query['q'])] + [mock.get_manga(manga_id + n) for n in range(1, limit)]
+            return self.send_json(200, {'data': [{'node': project(manga, fields)} for manga in matches], 'paging': {}})
+        match = re.fullmatch(r"/v2/(anime|manga)/(\d+)", path)
+        if match:
+            get_payload = mock.get_anime if match.group(1) == 'anime' else mock.get_manga
+            return self.send_json(200, project(get_payload(int(match.group(2))), fields))
+        self.send_json(404, {'message': "", 'error': "not_found"})
+
+    def page(self, nodes: list, total: int, offset: int, limit: int, query: dict) -> dict:
+        paging = {}
+        if offset + limit < total:
+            next_query = "&".join(f"{key}={value}" for key, value in dict(query, offset=offset + limit).items())
+            paging['next'] = f"http://{self.headers['Host']}{urlparse(self.path).path}?{next_query}"
+        if offset:
+            paging['previous'] = f"http://{self.headers['Host']}{urlparse(self.path).path}?offset={max(0, offset - limit)}"
+        return {'data': nodes, 'paging': paging}
+
+    def send_json(self, status: int, data: dict, headers: dict = None) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.mock.count('bytes_sent', len(body))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves a local stand-in for the MAL API.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of recorded responses")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each response is delayed by")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.0, help="Retry-After of the 429 responses")
+    parser.add_argument("--payload-size", type=int, default=0, help="padding characters added to every payload")
+    parser.add_argument("--season-size", type=int, default=60, help="number of shows in a generated season")
+    args = parser.parse_args()
+    mock = MockMALServer(args.port, args.fixtures, args.latency, args.throttle_rate, args.retry_after, args.payload_size, args.season_size)
+    print(f"Serving the MAL API on {mock.base_url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,316 @@
+"""
+season success prediction from pre-season statistics.
+
+One ridge regression per category (original, adaptation, sequel) maps the pre-season
+statistics of a show to the log of the FAL points it went on to score. The training
+shows are the lineups recorded by scraper_based_on_anime_type.py, with their last
+snapshot taken before their season was SEASON_GRACE old, and their points are the
+season totals written by fal-weekly-ranking/FAL_season_matrix.py --mal-ids.
+
+The ridge penalty is picked by k-fold cross-validation; each fold solves every
+penalty at once from one eigendecomposition. Features and predictions are computed
+for a whole SeasonFrame at once, so scoring a season is one matrix product.
+
+run python prediction_model.py <season.csv> [<season.csv> ...] to train and save the model.
+"""
+
+import argparse
+import csv
+import os
+import re
+from datetime import datetime, timedelta
+import numpy as np
+import mal_client
+from anime_data_model import TOTAL_MANGA
+from manga_rank_index import MangaRankIndex
+from season_frame import SeasonFrame
+from snapshot_store import SnapshotStore
+
+DEFAULT_PATH = os.path.join(mal_client.DATA_DIR, "prediction_model.npz")
+CATEGORIES = ('original', 'adaptation', 'sequel')
+BASE_FEATURES = ('log_p2w', 'log_favourites', 'favs_to_p2w')
+FEATURES = {
+    'original': BASE_FEATURES,
+    'adaptation': BASE_FEATURES + ('manga_percentile', 'manga_favs_to_users', 'log_manga_users'),
+    'sequel': BASE_FEATURES + ('log_prequel_completed', 'prequel_drop_rate', 'prequel_favs_to_p2w', 'prequel_rating'),
+}
+ALPHAS = np.logspace(-2, 3, 16) # ridge penalties tried by cross-validation
+FOLDS = 5
+MIN_SHOWS = 10 # a category with fewer training shows gets no model
+SEASON_MONTHS = {'winter': 1, 'spring': 4, 'summer': 7, 'fall': 10}
+SEASON_GRACE = timedelta(days=14) # shows are still picked in the first weeks of a season
+PARAMETERS = ('mean', 'scale', 'weights', 'intercept', 'alpha', 'rmse', 'shows')
+
+
+def get_features(frame: SeasonFrame, category: str) -> np.ndarray:
+    """
+    Returns the feature matrix of a frame, one row per show in FEATURES[category] order.
+    """
+    columns = [np.log1p(frame['p2w']), np.log1p(frame['favourites']), frame.favourites_per_100_p2w()]
+    if category == 'adaptation':
+        columns += [
+            np.maximum(frame.manga_percentile(), 0), # -1 for unscored manga
+            frame.favourite_to_num_list_users(),
+            np.log1p(frame['manga_num_list_users']),
+        ]
+    elif category == 'sequel':
+        columns += [
+            np.log1p(frame['prequel_completed']),
+            frame.drop_rate('prequel_'),
+            frame.favourites_per_100_p2w('prequel_'),
+            np.maximum(frame['prequel_rating'], 0), # -1 for unrated prequels
+        ]
+    return np.column_stack(columns).astype(float)
+
+
+def get_scaling(features: np.ndarray) -> tuple:
+    """
+    Returns the mean and standard deviation of each feature, with 1 for constant features.
+    """
+    scale = features.std(axis=0)
+    scale[scale == 0] = 1
+    return features.mean(axis=0), scale
+
+
+def ridge_weights(features: np.ndarray, targets: np.ndarray, alphas: np.ndarray) -> np.ndarray:
+    """
+    Solves ridge regression for every penalty at once.
+
+    Parameters:
+    features: Standardized features, one row per show.
+    targets: Centred targets.
+    alphas: The penalties.
+
+    Returns:
+    np.ndarray: The weights of each penalty, shape (len(alphas), number of features).
+    """
+    values, vectors = np.linalg.eigh(features.T @ features)
+    projected = vectors.T @ (features.T @ targets)
+    return (projected / (values + alphas[:, None])) @ vectors.T
+
+
+def cross_validate(features: np.ndarray, targets: np.ndarray, alphas: np.ndarray = ALPHAS, folds: int = FOLDS, seed: int = 0) -> np.ndarray:
+    """
+    Returns the out-of-fold predictions of every penalty, shape (len(targets), len(alphas)).
+    """
+    order = np.random.default_rng(seed).permutation(len(targets))
+    predictions = np.empty((len(targets), len(alphas)))
+    for fold in np.array_split(order, folds):
+        train = np.ones(len(targets), dtype=bool)
+        train[fold] = False
+        mean, scale = get_scaling(features[train])
+        intercept = targets[train].mean()
+        weights = ridge_weights((features[train] - mean) / scale, targets[train] - intercept, alphas)
+        predictions[fold] = ((features[fold] - mean) / scale) @ weights.T + intercept
+    return predictions
+
+
+def get_season_start(start_season: str) -> datetime:
+    """
+    Returns the first day of a season such as fall2024, or None if the season is unknown.
+    """
+    match = re.fullmatch(r"([a-z]+)(\d{4})", start_season or "")
+    if not match or match.group(1) not in SEASON_MONTHS:
+        return None
+    return datetime(int(match.group(2)), SEASON_MONTHS[match.group(1)], 1)
+
+
+def get_season_end(start_season: str) -> datetime:
+    """
+    Returns the first day after a season such as fall2024, or None if the season is unknown.
+    """
+    start = get_season_start(start_season)
+    if start is None:
+        return None
+    return datetime(start.year + start.month // 10, (start.month + 2) % 12 + 1, 1)
+
+
+def get_pre_season_cutoff(start_season: str) -> str:
+    """
+    Returns the time before which a snapshot of a show starting in start_season (e.g. fall2024)
+    counts as pre-season, or None if the season is unknown.
+    """
+    start = get_season_start(start_season)
+    if start is None:
+        return None
+    return (start + SEASON_GRACE).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def read_season_points(season_csv: str) -> dict:
+    """
+    Returns the total FAL points of every show with a MAL ID in a season CSV
+    written by FAL_season_matrix.py --mal-ids.
+    """
+    with open(season_csv, newline='') as file:
+        reader = csv.DictReader(file)
+        if 'MAL ID' not in reader.fieldnames:
+            raise ValueError(f"{season_csv} has no MAL ID column, write it with FAL_season_matrix.py --mal-ids")
+        return {int(row['MAL ID']): float(row['Total Pts']) for row in reader if int(row['MAL ID']) != -1}
+
+
+def get_pre_season_frame(store: SnapshotStore, category: str, anime_ids=None, total_manga: int = TOTAL_MANGA,
+                         ended_by: datetime = None) -> tuple:
+    """
+    Builds a frame of the pre-season snapshots of the shows recorded in the lineups of a category.
+    Shows without a pre-season snapshot of themselves (and of their manga or prequel) are left out.
+
+    Parameters:
+    store: The snapshot history.
+    category: original, adaptation or sequel.
+    anime_ids: Only include these shows. Defaults to every recorded show of the category.
+    total_manga: The number of manga with a score the manga percentiles are relative to.
+    ended_by: Only include shows whose season had ended by then, e.g. now for past seasons only.
+
+    Returns:
+    tuple[SeasonFrame, list[int]]: The shows and their ids, in the same order.
+    """
+    anime_rows, related_rows, ids = [], [], []
+    for lineup in store.lineups(category):
+        anime_id = lineup['anime_id']
+        if anime_ids is not None and anime_id not in anime_ids:
+            continue
+        latest = store.latest(anime_id)
+        cutoff = get_pre_season_cutoff(latest['start_season']) if latest else None
+        if cutoff and ended_by and get_season_end(latest['start_season']) > ended_by:
+            continue
+        anime_row = store.latest(anime_id, before=cutoff) if cutoff else None
+        if anime_row is None:
+            continue
+        related_row = None
+        if category == 'adaptation':
+            related_row = store.latest_manga(lineup['related_id'], before=cutoff)
+        elif category == 'sequel':
+            related_row = store.latest(lineup['related_id'], before=cutoff)
+        if category != 'original' and related_row is None:
+            continue
+        anime_rows.append(anime_row)
+        related_rows.append(related_row)
+        ids.append(anime_id)
+
+    frame = SeasonFrame.from_rows(
+        anime_rows,
+        manga_rows=related_rows if category == 'adaptation' else None,
+        prequel_rows=related_rows if category == 'sequel' else None,
+        total_manga=total_manga
+    )
+    return frame, ids
+
+
+def build_training_set(store: SnapshotStore, points: dict, category: str, total_manga: int = TOTAL_MANGA) -> tuple:
+    """
+    Pairs the recorded shows of a category that have FAL points with their pre-season snapshots.
+
+    Returns:
+    tuple[SeasonFrame, np.ndarray]: The shows and the points each scored.
+    """
+    frame, ids = get_pre_season_frame(store, category, points, total_manga)
+    return frame, np.array([points[anime_id] for anime_id in ids], dtype=float)
+
+
+class PredictionModel:
+    def __init__(self, parameters: dict = None) -> None:
+        """
+        parameters - fitted parameters by category: the mean and scale of the features, the weights
+            and intercept, the penalty picked by cross-validation, its cross-validated error in points
+            and the number of training shows
+        """
+        self.parameters = parameters or {}
+
+    def fit(self, category: str, frame: SeasonFrame, points: np.ndarray, alphas: np.ndarray = ALPHAS, folds: int = FOLDS) -> dict:
+        """
+        Fits the model of a category, picking the penalty with the lowest cross-validated error.
+
+        Parameters:
+        category: original, adaptation or sequel.
+        frame: The training shows, with their pre-season statistics.
+        points: The FAL points each show scored.
+        alphas: The penalties to try.
+        folds: The number of cross-validation folds.
+
+        Returns:
+        dict: The fitted parameters.
+        """
+        features = get_features(frame, category)
+        targets = np.log1p(np.maximum(points, 0))
+        predictions = cross_validate(features, targets, alphas, min(folds, len(targets)))
+        errors = np.sqrt(((predictions - targets[:, None]) ** 2).mean(axis=0))
+        best = int(errors.argmin())
+        rmse = np.sqrt(((np.expm1(predictions[:, best]) - points) ** 2).mean())
+
+        mean, scale = get_scaling(features)
+        intercept = targets.mean()
+        weights = ridge_weights((features - mean) / scale, targets - intercept, alphas[best:best + 1])[0]
+        self.parameters[category] = {
+            'mean': mean, 'scale': scale, 'weights': weights, 'intercept': intercept,
+            'alpha': alphas[best], 'rmse': rmse, 'shows': len(targets),
+        }
+        return self.parameters[category]
+
+    def predict(self, frame: SeasonFrame, category: str) -> np.ndarray:
+        """
+        Returns the predicted FAL points of every show of a frame.
+        """
+        parameters = self.parameters[category]
+        features = (get_features(frame, category) - parameters['mean']) / parameters['scale']
+        return np.maximum(np.expm1(features @ parameters['weights'] + parameters['intercept']), 0)
+
+    def __contains__(self, category: str) -> bool:
+        return category in self.parameters
+
+    def save(self, path: str = DEFAULT_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, **{
+            f"{category}_{name}": value
+            for category, parameters in self.parameters.items() for name, value in parameters.items()
+        })
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH):
+        """
+        Loads a saved model. A model that was never trained has no categories.
+        """
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as arrays:
+            return cls({
+                category: {name: arrays[f"{category}_{name}"] for name in PARAMETERS}
+                for category in CATEGORIES if f"{category}_weights" in arrays
+            })
+
+
+def train(season_csvs: list, store: SnapshotStore = None, total_manga: int = TOTAL_MANGA) -> PredictionModel:
+    """
+    Trains a model of every category with enough shows from past seasons.
+
+    Parameters:
+    season_csvs: Season CSVs with MAL IDs, one per past season.
+    store: The snapshot history. Defaults to the scrapers' store.
+    total_manga: The number of manga with a score the manga percentiles are relative to.
+
+    Returns:
+    PredictionModel: The trained model.
+    """
+    points = {}
+    for season_csv in season_csvs:
+        points.update(read_season_points(season_csv))
+    store = store or SnapshotStore()
+    model = PredictionModel()
+    for category in CATEGORIES:
+        frame, targets = build_training_set(store, points, category, total_manga)
+        if len(targets) < MIN_SHOWS:
+            print(f"{category}: {len(targets)} shows with pre-season snapshots and points, at least {MIN_SHOWS} are needed")
+            continue
+        parameters = model.fit(category, frame, targets)
+        print(f"{category}: {parameters['shows']} shows, alpha {parameters['alpha']:.3g}, "
+              f"cross-validated error {parameters['rmse']:.0f} points")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trains the FAL points prediction model on past seasons.")
+    parser.add_argument("season_csvs", nargs="+", help="season CSVs written by FAL_season_matrix.py --mal-ids")
+    parser.add_argument("--output", default=DEFAULT_PATH, help="where to save the model")
+    args = parser.parse_args()
+
+    model = train(args.season_csvs, total_manga=MangaRankIndex().total or TOTAL_MANGA)
+    model.save(args.output)
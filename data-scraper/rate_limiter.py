@@ -0,0 +1,88 @@
+"""
+client-side rate limiting for the MAL API.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """
+        rate - number of requests allowed per second. 0 or less disables limiting
+        burst - number of requests that may be sent back to back after idling
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request may be sent.
+
+        Returns:
+        float: The number of seconds spent waiting.
+        """
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops every caller from sending for the given number of seconds.
+        Used when the API reports that we are being throttled.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+def parse_retry_after(value: str) -> float:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    Returns:
+    float: The number of seconds to wait, or -1 if the header is missing or invalid.
+    """
+    if not value:
+        return -1
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return -1
+    if retry_at.tzinfo is None: # a -0000 zone means UTC but parses to a naive datetime
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with full jitter.
+
+    Parameters:
+    attempt: The retry number, starting at 0.
+    base: The delay of the first retry in seconds.
+    cap: The maximum delay in seconds.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,147 @@
+"""
+automatic original / adaptation / sequel classification.
+
+Walks the related_anime and related_manga edges of each show (with its source as a
+hint) to pick its main-line prequel or source manga, replacing the manual lookup
+step of the README. Prequel chains are resolved on a RelationGraph, so only the
+nodes it does not know yet are fetched, through a RequestCoalescer so nodes shared
+between shows, and the later typed-data run, are only requested once.
+"""
+
+import logging
+from difflib import SequenceMatcher
+import mal_client
+import field_profiles
+from relation_graph import RelationGraph
+
+logger = logging.getLogger(__name__)
+
+MIN_TITLE_SIMILARITY = 0.6
+
+# MAL manga media types that each anime source can be adapted from
+MANGA_TYPES_BY_SOURCE = {
+    'manga': ('manga', 'manhwa', 'manhua', 'one_shot', 'oel', 'doujinshi'),
+    '4_koma_manga': ('manga', 'one_shot'),
+    'web_manga': ('manga', 'manhwa', 'manhua'),
+    'digital_manga': ('manga', 'manhwa', 'manhua'),
+    'light_novel': ('light_novel', 'novel'),
+    'novel': ('novel', 'light_novel'),
+    'web_novel': ('novel', 'light_novel'),
+}
+
+
+def get_title_similarity(title: str, manga: dict) -> float:
+    titles = [manga['title']]
+    alternative_titles = manga.get('alternative_titles') or {}
+    titles += [alternative_titles.get('en'), alternative_titles.get('ja')] + (alternative_titles.get('synonyms') or [])
+    return max(SequenceMatcher(None, title.lower(), other.lower()).ratio() for other in titles if other)
+
+
+class RelationClassifier:
+    def __init__(self, coalescer, graph: RelationGraph = None) -> None:
+        """
+        coalescer - RequestCoalescer shared with the rest of the run
+        graph - RelationGraph the prequel chains are resolved on. Defaults to one kept for this run only
+        """
+        self.coalescer = coalescer
+        self.graph = graph or RelationGraph(":memory:")
+
+    def classify(self, anime_ids: list) -> tuple:
+        """
+        Sorts anime into originals, adaptations and sequels.
+
+        Parameters:
+        anime_ids: The IDs of the anime to classify.
+
+        Returns:
+        tuple[list[int], list[tuple[int, int]], list[tuple[int, int]]]:
+            originals as anime ids, adaptations as (anime id, manga id) and
+            sequels as (anime id, prequel id), ready for scraper_based_on_anime_type.
+        """
+        self.coalescer.prefetch([('anime', anime_id, field_profiles.CLASSIFY) for anime_id in anime_ids])
+        shows = [self.coalescer.anime(anime_id, field_profiles.CLASSIFY) for anime_id in anime_ids]
+
+        # cached payloads never reach the mal_client subscribers, so add them here
+        for anime_data in shows:
+            self.graph.add(anime_data)
+
+        prequels = self.resolve_prequels([anime_data['id'] for anime_data in shows])
+        originals, adaptations, sequels = [], [], []
+        for anime_data in shows:
+            prequel_id = prequels[anime_data['id']]
+            if prequel_id != -1:
+                sequels.append((anime_data['id'], prequel_id))
+                continue
+            manga_id = self.find_source_manga(anime_data)
+            if manga_id != -1:
+                adaptations.append((anime_data['id'], manga_id))
+            else:
+                if anime_data.get('source') in MANGA_TYPES_BY_SOURCE:
+                    logger.warning("could not find the source of %s (%s), treating it as an original", anime_data['title'], anime_data['id'])
+                originals.append(anime_data['id'])
+        return originals, adaptations, sequels
+
+    def resolve_prequels(self, anime_ids: list) -> dict:
+        """
+        Returns the main-line prequel of each anime (-1 if it has none), fetching in parallel
+        batches only the nodes the graph is missing, one level of the chains at a time.
+        """
+        prequels = {}
+        fetched = set()
+        pending = list(anime_ids)
+        while pending:
+            missing = set()
+            for anime_id in pending:
+                prequel_id, needed = self.graph.find_main_line_prequel(anime_id)
+                if needed:
+                    missing.update(needed)
+                else:
+                    prequels[anime_id] = prequel_id
+            pending = [anime_id for anime_id in pending if anime_id not in prequels]
+            missing -= fetched
+            if pending and not missing:
+                # the API did not return what the graph needs, give up on these chains
+                for anime_id in pending:
+                    logger.warning("could not resolve the prequel chain of %s", anime_id)
+                    prequels[anime_id] = -1
+                break
+            fetched |= missing
+            if missing:
+                requests = [('anime', anime_id, field_profiles.PREQUEL_CANDIDATE) for anime_id in missing]
+                self.coalescer.prefetch(requests)
+                for _, anime_id, fields in requests:
+                    self.graph.add(self.coalescer.anime(anime_id, fields))
+        return prequels
+
+    def find_source_manga(self, anime_data: dict) -> int:
+        """
+        Returns the id of the manga or novel an anime is adapted from, or -1 if it is not an adaptation.
+        Uses the related_manga adaptation edges and falls back to a title search,
+        keeping only results of a media type matching the anime's source.
+        """
+        manga_types = MANGA_TYPES_BY_SOURCE.get(anime_data.get('source'))
+        if manga_types is None:
+            return -1
+
+        adapted_from = [
+            related['node']['id'] for related in anime_data.get('related_manga') or []
+            if related['relation_type'] == 'adaptation'
+        ]
+        if len(adapted_from) == 1:
+            return adapted_from[0]
+        if adapted_from:
+            candidates = [self.coalescer.manga(manga_id, field_profiles.MANGA_CANDIDATE) for manga_id in adapted_from]
+        else:
+            # related_manga is often left empty by the API, search by title instead
+            candidates = mal_client.search_manga(anime_data['title'], field_profiles.MANGA_CANDIDATE)
+
+        matches = [
+            (get_title_similarity(anime_data['title'], manga), manga.get('num_list_users') or 0, manga['id'])
+            for manga in candidates if manga.get('media_type') in manga_types
+        ]
+        if not matches:
+            return -1
+        similarity, _, manga_id = max(matches)
+        if not adapted_from and similarity < MIN_TITLE_SIMILARITY:
+            return -1
+        return manga_id
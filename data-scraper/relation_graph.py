@@ -0,0 +1,194 @@
+"""
+persistent franchise relation graph.
+
+Indexes the related_anime edges of every fetched show in a local SQLite database,
+so prequel chains can be resolved from local data. It is updated incrementally:
+each new payload replaces the outgoing edges of its show.
+"""
+
+import os
+import sqlite3
+import threading
+import mal_client
+
+DEFAULT_PATH = os.path.join(mal_client.DATA_DIR, "relation_graph.sqlite3")
+
+PREQUEL_RELATIONS = ('prequel', 'parent_story') # in order of preference
+MAIN_LINE_MEDIA_TYPES = ('tv',)
+MAX_PREQUEL_DEPTH = 3 # how far back a non-TV prequel is followed to reach a TV one
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    anime_id INTEGER PRIMARY KEY,
+    title TEXT,
+    media_type TEXT,
+    start_date TEXT,
+    has_relations INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS edges (
+    anime_id INTEGER NOT NULL,
+    related_id INTEGER NOT NULL,
+    relation_type TEXT NOT NULL,
+    PRIMARY KEY (anime_id, related_id, relation_type)
+) WITHOUT ROWID;
+"""
+
+
+class RelationGraph:
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        """
+        path - SQLite database file, created if it does not exist. ":memory:" keeps the graph for one run only
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+        # the whole graph is kept in memory so every walk step is a dict lookup
+        self.nodes = {}
+        for anime_id, title, media_type, start_date, has_relations in self.connection.execute("SELECT * FROM nodes"):
+            self.nodes[anime_id] = {'title': title, 'media_type': media_type, 'start_date': start_date, 'has_relations': bool(has_relations)}
+        self.edges = {}
+        for anime_id, related_id, relation_type in self.connection.execute("SELECT * FROM edges"):
+            self.edges.setdefault(anime_id, []).append((related_id, relation_type))
+
+    def record(self, endpoint: str, payload: dict) -> None:
+        """
+        Adds a fetched payload to the graph. Meant to be registered with mal_client.subscribe.
+        """
+        if endpoint == 'anime':
+            self.add(payload)
+
+    def add(self, anime_data: dict) -> None:
+        """
+        Adds or updates a show. Its outgoing edges are replaced if the payload has related_anime;
+        otherwise only the node details it carries (media_type, start_date) are updated.
+        """
+        anime_id = anime_data['id']
+        node = self.nodes.get(anime_id, {'title': None, 'media_type': None, 'start_date': None, 'has_relations': False})
+        node = {
+            'title': anime_data.get('title') or node['title'],
+            'media_type': anime_data.get('media_type') or node['media_type'],
+            'start_date': anime_data.get('start_date') or node['start_date'],
+            'has_relations': node['has_relations'] or 'related_anime' in anime_data,
+        }
+        edges = None
+        if 'related_anime' in anime_data:
+            edges = [(related['node']['id'], related['relation_type']) for related in anime_data['related_anime'] or []]
+
+        with self.lock, self.connection:
+            self.nodes[anime_id] = node
+            self.connection.execute(
+                "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?)",
+                (anime_id, node['title'], node['media_type'], node['start_date'], int(node['has_relations']))
+            )
+            if edges is not None:
+                self.edges[anime_id] = edges
+                self.connection.execute("DELETE FROM edges WHERE anime_id = ?", (anime_id,))
+                self.connection.executemany("INSERT OR IGNORE INTO edges VALUES (?, ?, ?)", [(anime_id, *edge) for edge in edges])
+
+    def get_related(self, anime_id: int, relation_type: str) -> list:
+        return [related_id for related_id, relation in self.edges.get(anime_id, []) if relation == relation_type]
+
+    def has_details(self, anime_id: int) -> bool:
+        return self.nodes.get(anime_id, {}).get('media_type') is not None
+
+    def has_relations(self, anime_id: int) -> bool:
+        return self.nodes.get(anime_id, {}).get('has_relations', False)
+
+    def get_prequel_candidates(self, anime_id: int) -> list:
+        """
+        Returns the direct prequels of a show, falling back to its parent story for spin-offs.
+        """
+        for relation_type in PREQUEL_RELATIONS:
+            candidates = self.get_related(anime_id, relation_type)
+            if candidates:
+                return candidates
+        return []
+
+    def pick_main_line(self, anime_ids: list, latest: bool = True) -> int:
+        """
+        Returns the main-line entry among candidates: TV entries first, then the latest
+        (or earliest) to start. Every candidate must have its details in the graph.
+        """
+        main_line = [anime_id for anime_id in anime_ids if self.nodes[anime_id]['media_type'] in MAIN_LINE_MEDIA_TYPES]
+        if latest:
+            return max(main_line or anime_ids, key=lambda anime_id: self.nodes[anime_id]['start_date'] or "")
+        # shows that have not started yet have no start date and come last
+        return min(main_line or anime_ids, key=lambda anime_id: self.nodes[anime_id]['start_date'] or "9999")
+
+    def find_main_line_prequel(self, anime_id: int, max_depth: int = MAX_PREQUEL_DEPTH) -> tuple:
+        """
+        Resolves the most recent main-line (TV) prequel of a show from local data.
+        If no TV prequel is found within max_depth steps, the latest direct prequel is used.
+
+        Parameters:
+        anime_id: The ID of the show.
+        max_depth: How many prequel steps are followed past non-TV entries.
+
+        Returns:
+        tuple[int, list[int]]: The prequel id (-1 if the show has none) and the ids whose
+            details or relations are missing from the graph. When that list is not empty the
+            prequel id is None; add those shows and call again.
+        """
+        if not self.has_relations(anime_id):
+            return None, [anime_id]
+        candidates = self.get_prequel_candidates(anime_id)
+        if not candidates:
+            return -1, []
+        missing = [candidate for candidate in candidates if not self.has_details(candidate)]
+        if missing:
+            return None, missing
+
+        fallback = prequel_id = self.pick_main_line(candidates)
+        for _ in range(max_depth):
+            if self.nodes[prequel_id]['media_type'] in MAIN_LINE_MEDIA_TYPES:
+                return prequel_id, []
+            if not self.has_relations(prequel_id):
+                return None, [prequel_id]
+            candidates = self.get_related(prequel_id, 'prequel')
+            missing = [candidate for candidate in candidates if not self.has_details(candidate)]
+            if missing:
+                return None, missing
+            if not candidates:
+                break
+            prequel_id = self.pick_main_line(candidates)
+        return fallback, []
+
+    def franchise_chain(self, anime_id: int) -> list:
+        """
+        Returns the main-line chain of a franchise through a show, oldest first, using only local data.
+        Each step follows the main-line prequel (backwards) or sequel (forwards) edge that is known.
+        """
+        backward = []
+        visited = {anime_id}
+        current = anime_id
+        while True:
+            candidates = [prequel for prequel in self.get_related(current, 'prequel') if prequel not in visited and self.has_details(prequel)]
+            if not candidates:
+                break
+            current = self.pick_main_line(candidates)
+            visited.add(current)
+            backward.append(current)
+
+        forward = []
+        current = anime_id
+        while True:
+            candidates = [sequel for sequel in self.get_related(current, 'sequel') if sequel not in visited and self.has_details(sequel)]
+            if not candidates:
+                break
+            current = self.pick_main_line(candidates, latest=False)
+            visited.add(current)
+            forward.append(current)
+
+        return backward[::-1] + [anime_id] + forward
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,66 @@
+"""
+run-scoped request coalescing.
+
+Collects every anime and manga a run needs, fetches each unique id exactly once
+(even when the same id is requested from several threads at the same time) and
+hands the same payload to everything that asked for it.
+"""
+
+import threading
+from concurrent.futures import Future
+import mal_client
+from field_profiles import covers, merge_fields
+
+
+class RequestCoalescer:
+    def __init__(self, fetch_anime, fetch_manga, max_workers: int = mal_client.MAX_WORKERS) -> None:
+        """
+        fetch_anime - function returning the payload of an anime, called with (anime_id, fields)
+        fetch_manga - function returning the payload of a manga, called with (manga_id, fields)
+        max_workers - number of requests run in parallel by prefetch
+        """
+        self.fetchers = {'anime': fetch_anime, 'manga': fetch_manga}
+        self.max_workers = max_workers
+        self.futures = {} # (endpoint, id) -> (fields, Future)
+        self.lock = threading.Lock()
+
+    def prefetch(self, requests) -> None:
+        """
+        Fetches every unique resource up front, in parallel.
+
+        Parameters:
+        requests: (endpoint, id, fields) tuples the run needs. A resource requested
+            several times is fetched once, with the union of the fields.
+        """
+        wanted = {}
+        for endpoint, resource_id, fields in requests:
+            key = (endpoint, resource_id)
+            wanted[key] = merge_fields(wanted[key], fields) if key in wanted else fields
+        mal_client.fetch_concurrently(
+            lambda item: self._get(*item[0], item[1]), list(wanted.items()), self.max_workers
+        )
+
+    def anime(self, anime_id: int, fields: str) -> dict:
+        return self._get('anime', anime_id, fields)
+
+    def manga(self, manga_id: int, fields: str) -> dict:
+        return self._get('manga', manga_id, fields)
+
+    def _get(self, endpoint: str, resource_id: int, fields: str) -> dict:
+        key = (endpoint, resource_id)
+        with self.lock:
+            fetched_fields, future = self.futures.get(key, ("", None))
+            owner = future is None or not covers(fetched_fields, fields)
+            if owner:
+                fields = merge_fields(fetched_fields, fields)
+                future = Future()
+                self.futures[key] = (fields, future)
+        if owner:
+            try:
+                future.set_result(self.fetchers[endpoint](resource_id, fields))
+            except BaseException as error:
+                future.set_exception(error)
+        return future.result()
+
+    def __len__(self) -> int:
+        return len(self.futures)
@@ -0,0 +1,150 @@
+"""
+persistent on-disk cache of MAL API responses.
+
+Entries are content addressed by endpoint and id and remember which fields they
+hold, so a request for fewer fields is served from a wider cached payload and a
+request for new fields is merged into it. Entries expire after a per-resource TTL
+and are evicted least recently used first once the cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# how long a response stays fresh, by endpoint and airing/publishing status
+TTLS = {
+    ('anime', 'finished_airing'): 30 * DAY,
+    ('anime', 'currently_airing'): 6 * HOUR,
+    ('anime', 'not_yet_aired'): DAY,
+    ('manga', 'finished'): 30 * DAY,
+    ('manga', 'currently_publishing'): 7 * DAY,
+    ('manga', 'on_hiatus'): 7 * DAY,
+    ('manga', 'discontinued'): 30 * DAY,
+}
+DEFAULT_TTL = DAY
+
+
+def get_ttl(endpoint: str, payload: dict) -> int:
+    """
+    Returns how many seconds a response stays fresh.
+
+    Parameters:
+    endpoint: The resource type (anime or manga).
+    payload: The response from the MAL API. Its status field picks the TTL.
+    """
+    return TTLS.get((endpoint, payload.get('status')), DEFAULT_TTL)
+
+
+def split_fields(fields: str) -> set:
+    return {field.strip() for field in fields.split(",") if field.strip()}
+
+
+class ResponseCache:
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        """
+        directory - folder the entries are written to
+        max_bytes - total size of the entries above which the least recently used are evicted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.sizes = None # path -> size, loaded on first write
+
+    def get_key(self, endpoint: str, resource_id: int) -> str:
+        return hashlib.sha256(f"{endpoint}/{resource_id}".encode()).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, endpoint: str, resource_id: int, fields: str):
+        """
+        Returns the cached response, or None if it is missing, stale or lacks some of the fields.
+        """
+        path = self.get_path(self.get_key(endpoint, resource_id))
+        entry = self._read_fresh(path)
+        if entry is None or not split_fields(fields) <= set(entry['fields']):
+            return None
+        try:
+            os.utime(path) # mark as recently used
+        except OSError:
+            pass
+        return entry['payload']
+
+    def put(self, endpoint: str, resource_id: int, fields: str, payload: dict) -> None:
+        """
+        Stores a response, merging it into a fresh cached payload of the same resource,
+        and evicts the least recently used entries if the cache is full.
+        """
+        path = self.get_path(self.get_key(endpoint, resource_id))
+        fetched_at = time.time()
+        cached = self._read_fresh(path)
+        if cached is not None:
+            # the merged entry expires with its oldest fields
+            payload = {**cached['payload'], **payload}
+            fields = ",".join(cached['fields'] + [fields])
+            fetched_at = cached['fetched_at']
+        entry = {
+            'endpoint': endpoint,
+            'id': resource_id,
+            'fields': sorted(split_fields(fields)),
+            'fetched_at': fetched_at,
+            'ttl': get_ttl(endpoint, payload),
+            'payload': payload,
+        }
+        data = json.dumps(entry).encode('utf-8')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            if self.sizes is None:
+                self.sizes = self._scan()
+            self.sizes[path] = len(data)
+            if sum(self.sizes.values()) > self.max_bytes:
+                self._evict()
+
+    def _read_fresh(self, path: str):
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry['fetched_at'] > entry['ttl']:
+            return None
+        return entry
+
+    def clear(self) -> None:
+        with self.lock:
+            for path in self._scan():
+                os.remove(path)
+            self.sizes = {}
+
+    def _scan(self) -> dict:
+        sizes = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    sizes[path] = os.path.getsize(path)
+        return sizes
+
+    def _evict(self) -> None:
+        # evict down to 90% so a full cache does not evict on every write
+        target = self.max_bytes * 0.9
+        total = sum(self.sizes.values())
+        by_last_use = sorted(self.sizes, key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in by_last_use:
+            if total <= target:
+                break
+            total -= self.sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -1,328 +1,150 @@
+import argparse
 import datetime
-import requests
-from openpyxl import Workbook
-from openpyxl.comments import Comment
-from openpyxl.styles import Alignment, Font
-from openpyxl.formatting.rule import ColorScaleRule
-from openpyxl.utils import get_column_letter
-from dotenv import load_dotenv
-import os
-from anime_data_model import Anime, AdaptedAnime, SequelAnime
-
-load_dotenv()
-CLIENT_ID = os.getenv("CLIENT_ID")
-
-def fetch_anime_data(anime_id):
-    url = f'https://api.myanimelist.net/v2/anime/{anime_id}?fields=mean,num_favorites,statistics,related_manga,start_season'
-    response = requests.get(url, headers={'X-MAL-CLIENT-ID': CLIENT_ID})
-    response.raise_for_status()
-    anime_data = response.json()
-    try:
-        print(anime_data)
-    except:
-        print("cant print")
-    response.close()
+import logging
+from openpyxl import load_workbook
+import mal_client
+import instrumentation
+from snapshot_store import SnapshotStore
+import field_profiles
+from sheet_writer import Column, create_workbook, render_sheet
+from request_coalescer import RequestCoalescer
+from relation_classifier import RelationClassifier
+from relation_graph import RelationGraph
+from title_index import TitleIndex
+from manga_rank_index import MangaRankIndex
+from anime_data_model import TOTAL_MANGA
+from season_frame import SeasonFrame
+from prediction_model import PredictionModel
+from colour_thresholds import ColourThresholds
+
+logger = logging.getLogger(__name__)
+
+def fetch_anime_data(anime_id, fields=field_profiles.ANIME):
+    anime_data = mal_client.fetch_anime_data(anime_id, fields)
+    logger.debug("%s", anime_data)
     return anime_data
 
-def fetch_manga_data(manga_id):
-    url = f'https://api.myanimelist.net/v2/manga/{manga_id}?fields=mean,num_favorites,num_list_users,rank,media_type,related_manga'
-    response = requests.get(url, headers={'X-MAL-CLIENT-ID': CLIENT_ID})
-    response.raise_for_status()
-    manga_data = response.json()
+def fetch_manga_data(manga_id, fields=field_profiles.MANGA):
+    manga_data = mal_client.fetch_manga_data(manga_id, fields)
+    logger.debug("%s", manga_data)
 
     # print(manga_data["title"])
     # for related_manga in manga_data["related_manga"]:
     #     if related_manga["relation_type"] == "alternative_version":
     #         print((manga_data["id"], related_manga["node"]["id"]))
-    response.close()
     return manga_data
 
-def create_anime(anime_id):
-    anime_data = fetch_anime_data(anime_id)
+def get_manga_data(manga_id, coalescer=None, manga_index=None):
+    """
+    Returns the manga fields read by AdaptedAnime, from the ranking index when the manga is ranked.
+    """
+    if manga_index is not None and manga_id in manga_index:
+        return manga_index.get_payload(manga_id)
+    return coalescer.manga(manga_id, field_profiles.MANGA) if coalescer else fetch_manga_data(manga_id)
 
-    anime = Anime(anime_data)
-    return anime
+FAV_TO_P2W_COMMENT = "Favourite to Plan to Watch. Favourites/Plan to Watch * 100"
 
-def create_adapted_anime(anime_id, manga_id):
-    anime_data = fetch_anime_data(anime_id)
-    manga_data = fetch_manga_data(manga_id)
-
-    adapted_anime = AdaptedAnime(
-        anime_data, manga_data
-    )
-    return adapted_anime
-
-def create_sequel_anime(anime_id, prequel_id, type=-1, season="unknown"):
-    anime_data = fetch_anime_data(anime_id)
-    prequel_data = fetch_anime_data(prequel_id)
-
-    sequel_anime = SequelAnime(
-        anime_data,
-        prequel_data,
-        type,
-        season
-    )
-    return sequel_anime
-
-def create_originals_sheet(workbook, originals_list):
-    TITLE = 1
-    PLAN_TO_WATCH = 2
-    FAVOURITE = 3
-    FAV_TO_P2W = 4
-
-    headers = ['Title', 'P2W', 'Favourites', 'Favs:P2W']
-
-    original_sheet = workbook.create_sheet(title="Originals")
-
-    for i, header in enumerate(headers):
-        original_sheet.cell(1, i+1).value = header
-        original_sheet.cell(1, i+1).alignment = Alignment(horizontal='center')
-        original_sheet.cell(1, i+1).font = Font(bold=True)
-        original_sheet.freeze_panes = 'B2'
-
-    for j, anime in enumerate(originals_list):
-        original_sheet.cell(j+2, TITLE).value = anime.title
-        original_sheet.cell(j+2, PLAN_TO_WATCH).value = anime.p2w
-        original_sheet.cell(j+2, FAVOURITE).value = anime.favourites
-        original_sheet.cell(j+2, FAV_TO_P2W).value = anime.favourites_per_100_p2w()
-
-        original_sheet.cell(j+2, TITLE).hyperlink = anime.get_mal_link()
-
-    # Apply conditional formatting to the P2W column
-    p2w_col_letter = get_column_letter(PLAN_TO_WATCH)
-    p2w_range = f"{p2w_col_letter}2:{p2w_col_letter}{len(originals_list) + 1}"
+# the colour scales below are used until colour_thresholds has enough past shows to calibrate them
 
+ORIGINAL_COLUMNS = [
+    Column('Title', lambda anime: anime.title, link=lambda anime: anime.get_mal_link()),
     # note: Mettalic Rouge had 20150 and it flopped.
     # The only good orignal I have witnessed was Undead Girl Murder Farce which had 18235
-    colour_rule = ColorScaleRule(
-        start_type='num', start_value=5000, start_color='FF9999',    # Red
-        mid_type='num', mid_value=10000, mid_color='FFFF99',      # Yellow
-        end_type='num', end_value=25000, end_color='99FF99'       # Green
-    )
-
-    original_sheet.conditional_formatting.add(p2w_range, colour_rule)
-
-
-    original_sheet[get_column_letter(PLAN_TO_WATCH) + '1'].comment = Comment("Plan to Watch", "Author")
-    original_sheet[get_column_letter(FAV_TO_P2W) + '1'].comment = Comment("Favourite to Plan to Watch. Favourites/Plan to Watch * 100", "Author")
-
-    original_sheet.column_dimensions[get_column_letter(FAVOURITE)].hidden = True
-    original_sheet.column_dimensions[get_column_letter(FAV_TO_P2W)].hidden = True
-
-def create_adaptations_sheet(workbook, adaptations_list):
-    TITLE = 1
-    FAVOURITE = 2
-    PLAN_TO_WATCH = 3
-    FAV_TO_P2W = 4
-    TYPE = 5
-    MANGA_NUM_USERS = 6
-    MANGA_FAVOURITE = 7
-    MANGA_SCORE = 8
-    MANGA_RANK = 9
-    MANGA_PERCENTILE = 10
-    MANGA_FAV_TO_NUM_USERS = 11
-    headers = ['Title', 'Favourites', 'P2W', 'Favs:P2W', 'TYPE', 'M_#Users', 'M_Favs', 'M_Score', 'M_Rank', 'M_%ile', 'M_Favs:Users']
-    adaptation_sheet = workbook.create_sheet(title="Adaptations")
-
-    for i, header in enumerate(headers):
-        adaptation_sheet.cell(1, i+1).value = header
-        adaptation_sheet.cell(1, i+1).alignment = Alignment(horizontal='center')
-        adaptation_sheet.cell(1, i+1).font = Font(bold=True)
-        adaptation_sheet.freeze_panes = 'B2'
-
-    for j, anime in enumerate(adaptations_list):
-        adaptation_sheet.cell(j+2, TITLE).value = anime.title
-        adaptation_sheet.cell(j+2, FAVOURITE).value = anime.favourites
-        adaptation_sheet.cell(j+2, PLAN_TO_WATCH).value = anime.p2w
-        adaptation_sheet.cell(j+2, FAV_TO_P2W).value = anime.favourites_per_100_p2w()
-        adaptation_sheet.cell(j+2, TYPE).value = anime.manga_type
-        adaptation_sheet.cell(j+2, MANGA_NUM_USERS).value = anime.manga_num_list_users
-        adaptation_sheet.cell(j+2, MANGA_FAVOURITE).value = anime.manga_favourite
-        adaptation_sheet.cell(j+2, MANGA_SCORE).value = anime.manga_score
-        adaptation_sheet.cell(j+2, MANGA_RANK).value = anime.manga_rank
-        adaptation_sheet.cell(j+2, MANGA_PERCENTILE).value = anime.get_manga_percentile()
-        adaptation_sheet.cell(j+2, MANGA_FAV_TO_NUM_USERS).value = anime.manga_favourite / anime.manga_num_list_users * 100
-
-
-        adaptation_sheet.cell(j+2, TITLE).hyperlink = anime.get_mal_link()
-
-    # Apply conditional formatting to the P2W column
-    p2w_col_letter = get_column_letter(PLAN_TO_WATCH)
-    p2w_range = f"{p2w_col_letter}2:{p2w_col_letter}{len(adaptations_list) + 1}"
-    colour_rule = ColorScaleRule(
-        start_type='num', start_value=0, start_color='FF9999',    # Red
-        mid_type='num', mid_value=20000, mid_color='FFFF99',
-        end_type='num', end_value=70000, end_color='99FF99'       # Green
-    )
-    adaptation_sheet.conditional_formatting.add(p2w_range, colour_rule)
-
-    # Apply conditional formatting to the favourites column
-    favourite_col_letter = get_column_letter(FAVOURITE)
-    favourite_range = f"{favourite_col_letter}2:{favourite_col_letter}{len(adaptations_list) + 1}"
-    favourite_colour_rule = ColorScaleRule(
-        start_type='num', start_value=0, start_color='FF9999',    # Red
-        mid_type='num', mid_value=100, mid_color='FFFF99',
-        end_type='num', end_value=1000, end_color='99FF99'       # Green
-    )
-    adaptation_sheet.conditional_formatting.add(favourite_range, favourite_colour_rule)
-    # Apply conditional formatting to the manga score column
-    manga_score_col_letter = get_column_letter(MANGA_SCORE)
-    manga_score_range = f"{manga_score_col_letter}2:{manga_score_col_letter}{len(adaptations_list) + 1}"
-    manga_score_colour_rule = ColorScaleRule(
-        start_type='num', start_value=6.5, start_color='FF9999',    # Red
-        mid_type='num', mid_value=7.5, mid_color='FFFF99',
-        end_type='num', end_value=8.5, end_color='99FF99'       # Green
-    )
-    adaptation_sheet.conditional_formatting.add(manga_score_range, manga_score_colour_rule)
-    # Apply conditional formatting to the manga rank column
-    # manga_rank_col_letter = get_column_letter(MANGA_RANK)
-    # manga_rank_range = f"{manga_rank_col_letter}2:{manga_rank_col_letter}{len(adaptations_list) + 1}"
-    # manga_rank_colour_rule = ColorScaleRule(
-    #     start_type='num', start_value=10000, start_color='FF9999',    # Red
-    #     mid_type='num', mid_value=5000, mid_color='FFFF99',
-    #     end_type='num', end_value=1000, end_color='99FF99'       # Green
-    # )
-    # adaptation_sheet.conditional_formatting.add(manga_rank_range, manga_rank_colour_rule)
-
-    # Apply conditional formatting to the manga percentile column
-    manga_percentile_col_letter = get_column_letter(MANGA_PERCENTILE)
-    manga_percentile_range = f"{manga_percentile_col_letter}2:{manga_percentile_col_letter}{len(adaptations_list) + 1}"
-    manga_percentile_colour_rule = ColorScaleRule(
-        start_type='num', start_value=0, start_color='FF9999',    # Red
-        mid_type='num', mid_value=50, mid_color='FFFF99',
-        end_type='num', end_value=100, end_color='99FF99'       # Green
-    )
-    adaptation_sheet.conditional_formatting.add(manga_percentile_range, manga_percentile_colour_rule)
-
-    # Apply conditional format to manga num users column
-    manga_num_users_col_letter = get_column_letter(MANGA_NUM_USERS)
-    manga_num_users_range = f"{manga_num_users_col_letter}2:{manga_num_users_col_letter}{len(adaptations_list) + 1}"
-    manga_num_users_colour_rule = ColorScaleRule(
-        start_type='num', start_value=5000, start_color='FF9999',    # Red
-        mid_type='num', mid_value=10000, mid_color='FFFF99',
-        end_type='num', end_value=50000, end_color='99FF99'       # Green
-    )
-    adaptation_sheet.conditional_formatting.add(manga_num_users_range, manga_num_users_colour_rule)
-
-    # Apply conditional format to manga favourites column
-    manga_favourites_col_letter = get_column_letter(MANGA_FAVOURITE)
-    manga_favourites_range = f"{manga_favourites_col_letter}2:{manga_favourites_col_letter}{len(adaptations_list) + 1}"
-    manga_favourites_colour_rule = ColorScaleRule(
-        start_type='num', start_value=0, start_color='FF9999',    # Red
-        mid_type='num', mid_value=200, mid_color='FFFF99',
-        end_type='num', end_value=2000, end_color='99FF99'       # Green
-    )
-    adaptation_sheet.conditional_formatting.add(manga_favourites_range, manga_favourites_colour_rule)
-
-    adaptation_sheet[get_column_letter(PLAN_TO_WATCH) + '1'].comment = Comment("Plan to Watch", "Author")
-    adaptation_sheet[get_column_letter(FAV_TO_P2W) + '1'].comment = Comment("Favourite to Plan to Watch. Favourites/Plan to Watch * 100", "Author")
-    adaptation_sheet[get_column_letter(MANGA_NUM_USERS) + '1'].comment = Comment("Number of users who have added the manga to their list", "Author")
-    adaptation_sheet[get_column_letter(MANGA_FAVOURITE) + '1'].comment = Comment("Number of users who have favorited the manga", "Author")
-    adaptation_sheet[get_column_letter(MANGA_SCORE) + '1'].comment = Comment("Mean score of the manga", "Author")
-    adaptation_sheet[get_column_letter(MANGA_RANK) + '1'].comment = Comment("Rank of the manga", "Author")
-    adaptation_sheet[get_column_letter(MANGA_PERCENTILE) + '1'].comment = Comment("Percentile of the manga", "Author")
-    adaptation_sheet[get_column_letter(MANGA_FAV_TO_NUM_USERS) + '1'].comment = Comment("Favourites to Number of Users. Favourites/Number of Users * 100", "Author")
-
-    # hide ratio
-    adaptation_sheet.column_dimensions[get_column_letter(FAV_TO_P2W)].hidden = True
-    adaptation_sheet.column_dimensions[get_column_letter(MANGA_FAV_TO_NUM_USERS)].hidden = True
-    adaptation_sheet.column_dimensions[get_column_letter(MANGA_PERCENTILE)].hidden = True
-    adaptation_sheet.column_dimensions[get_column_letter(MANGA_RANK)].hidden = True
-
-
-    return adaptation_sheet
-
-
-def create_sequels_sheet(workbook, sequels_list):
-    TITLE = 1
-    FAVOURITE = 2
-    PLAN_TO_WATCH = 3
-    FAV_TO_P2W = 4
-    TYPE = 5
-    SEASON = 6
-    PREQUEL_COMPLETED = 7
-    PREQUEL_WATCHING = 8
-    PREQUEL_DROPPED = 9
-    PREQUEL_DROP_RATE = 10
-    PREQUEL_RATING = 11
-    PREQUEL_TITLE = 12
-    PREQUEL_AIRING = 13
-
-    headers = ['Title', 'Favourites', 'P2W', 'Favs:P2W', 'Type', 'Season', 'P Completed', 'P Watching', 'P Dropped', 'P Drop Rate', 'P Rating', 'P Title', "P air"]
-    sequel_sheet = workbook.create_sheet(title="Sequels")
-
-    for i, header in enumerate(headers):
-        sequel_sheet.cell(1, i+1).value = header
-        sequel_sheet.cell(1, i+1).alignment = Alignment(horizontal='center')
-        sequel_sheet.cell(1, i+1).font = Font(bold=True)
-        sequel_sheet.freeze_panes = 'B2'
-
-    for j, sequel_anime in enumerate(sequels_list):
-        sequel_sheet.cell(j+2, TITLE).value = sequel_anime.title
-        sequel_sheet.cell(j+2, FAVOURITE).value = sequel_anime.favourites
-        sequel_sheet.cell(j+2, PLAN_TO_WATCH).value = sequel_anime.p2w
-        sequel_sheet.cell(j+2, FAV_TO_P2W).value = sequel_anime.favourites_per_100_p2w()
-        sequel_sheet.cell(j+2, TYPE).value = sequel_anime.sequel_type
-        sequel_sheet.cell(j+2, SEASON).value = sequel_anime.season
-        sequel_sheet.cell(j+2, PREQUEL_COMPLETED).value = sequel_anime.prequel.completed
-        sequel_sheet.cell(j+2, PREQUEL_WATCHING).value = sequel_anime.prequel.watching
-        sequel_sheet.cell(j+2, PREQUEL_DROPPED).value = sequel_anime.prequel.dropped
-        sequel_sheet.cell(j+2, PREQUEL_DROP_RATE).value = sequel_anime.prequel.get_drop_rate()
-        sequel_sheet.cell(j+2, PREQUEL_RATING).value = sequel_anime.prequel.rating
-        sequel_sheet.cell(j+2, PREQUEL_TITLE).value = sequel_anime.prequel.title
-        sequel_sheet.cell(j+2, PREQUEL_AIRING).value = sequel_anime.prequel_airing
-
-        sequel_sheet.cell(j+2, TITLE).hyperlink = sequel_anime.get_mal_link()
-        sequel_sheet.cell(j+2, PREQUEL_TITLE).hyperlink = sequel_anime.prequel.get_mal_link()
-
-    # Apply conditional formatting to the P2W column
-    p2w_col_letter = get_column_letter(PLAN_TO_WATCH)
-    p2w_range = f"{p2w_col_letter}2:{p2w_col_letter}{len(sequels_list) + 1}"
-    colour_rule = ColorScaleRule(
-        start_type='num', start_value=20000, start_color='FF9999',    # Red
-        mid_type='num', mid_value=50000, mid_color='FFFF99',      # Yellow
-        end_type='num', end_value=70000, end_color='99FF99'       # Green
-    )
-    sequel_sheet.conditional_formatting.add(p2w_range, colour_rule)
-    # Apply conditional formatting to prequel completed column
-    prequel_completed_col_letter = get_column_letter(PREQUEL_COMPLETED)
-    prequel_completed_range = f"{prequel_completed_col_letter}2:{prequel_completed_col_letter}{len(sequels_list) + 1}"
-    prequel_completed_colour_rule = ColorScaleRule(
-        start_type='num', start_value=50000, start_color='FF9999',    # Red
-        mid_type='num', mid_value=100000, mid_color='FFFF99',      # Yellow
-        end_type='num', end_value=200000, end_color='99FF99'       # Green
-    )
-    sequel_sheet.conditional_formatting.add(prequel_completed_range, prequel_completed_colour_rule)
-    # Apply conditional formatting to prequel rating column
-    prequel_rating_col_letter = get_column_letter(PREQUEL_RATING)
-    prequel_rating_range = f"{prequel_rating_col_letter}2:{prequel_rating_col_letter}{len(sequels_list) + 1}"
-    prequel_rating_colour_rule = ColorScaleRule(
-        start_type='num', start_value=6.5, start_color='FF9999',    # Red
-        mid_type='num', mid_value=7.5, mid_color='FFFF99',      # Yellow
-        end_type='num', end_value=8.5, end_color='99FF99'       # Green
-    )
-    sequel_sheet.conditional_formatting.add(prequel_rating_range, prequel_rating_colour_rule)
-
-    # Add comments to the headers
-    sequel_sheet[get_column_letter(PLAN_TO_WATCH) + '1'].comment = Comment("Plan to Watch", "Author")
-    sequel_sheet[get_column_letter(FAV_TO_P2W) + '1'].comment = Comment("Favourite to Plan to Watch. Favourites/Plan to Watch * 100", "Author")
-    sequel_sheet[get_column_letter(PREQUEL_COMPLETED) + '1'].comment = Comment("Users Completed last part", "Author")
-    sequel_sheet[get_column_letter(PREQUEL_WATCHING) + '1'].comment = Comment("Users Watching last part", "Author")
-    sequel_sheet[get_column_letter(PREQUEL_DROPPED) + '1'].comment = Comment("Users Dropped last part", "Author")
-    sequel_sheet[get_column_letter(PREQUEL_DROP_RATE) + '1'].comment = Comment("Of last part: Dropped / (Dropped + Completed + Watching) * 100", "Author")
-    sequel_sheet[get_column_letter(PREQUEL_RATING) + '1'].comment = Comment("Rating of last part", "Author")
-
-    # hide
-    sequel_sheet.column_dimensions[get_column_letter(FAV_TO_P2W)].hidden = True
-    sequel_sheet.column_dimensions[get_column_letter(PREQUEL_DROP_RATE)].hidden = True
-    sequel_sheet.column_dimensions[get_column_letter(PREQUEL_TITLE)].hidden = True
-    sequel_sheet.column_dimensions[get_column_letter(PREQUEL_DROPPED)].hidden = True
-    sequel_sheet.column_dimensions[get_column_letter(TYPE)].hidden = True
-    sequel_sheet.column_dimensions[get_column_letter(SEASON)].hidden = True
-
-
-
-def main():
+    Column('P2W', lambda anime: anime.p2w, "Plan to Watch", colour_scale=(5000, 10000, 25000)),
+    Column('Favourites', lambda anime: anime.favourites, hidden=True),
+    Column('Favs:P2W', lambda anime: anime.favourites_per_100_p2w(), FAV_TO_P2W_COMMENT, hidden=True),
+]
+
+ADAPTATION_COLUMNS = [
+    Column('Title', lambda anime: anime.title, link=lambda anime: anime.get_mal_link()),
+    Column('Favourites', lambda anime: anime.favourites, colour_scale=(0, 100, 1000)),
+    Column('P2W', lambda anime: anime.p2w, "Plan to Watch", colour_scale=(0, 20000, 70000)),
+    Column('Favs:P2W', lambda anime: anime.favourites_per_100_p2w(), FAV_TO_P2W_COMMENT, hidden=True),
+    Column('TYPE', lambda anime: anime.manga_type),
+    Column('M_#Users', lambda anime: anime.manga_num_list_users, "Number of users who have added the manga to their list", colour_scale=(5000, 10000, 50000)),
+    Column('M_Favs', lambda anime: anime.manga_favourite, "Number of users who have favorited the manga", colour_scale=(0, 200, 2000)),
+    Column('M_Score', lambda anime: anime.manga_score, "Mean score of the manga", colour_scale=(6.5, 7.5, 8.5)),
+    Column('M_Rank', lambda anime: anime.manga_rank, "Rank of the manga", hidden=True), # colour_scale=(10000, 5000, 1000)
+    Column('M_%ile', lambda anime: anime.get_manga_percentile(), "Percentile of the manga", colour_scale=(0, 50, 100), hidden=True),
+    Column('M_Favs:Users', lambda anime: anime.get_favourite_to_num_list_users(), "Favourites to Number of Users. Favourites/Number of Users * 100", hidden=True),
+]
+
+SEQUEL_COLUMNS = [
+    Column('Title', lambda anime: anime.title, link=lambda anime: anime.get_mal_link()),
+    Column('Favourites', lambda anime: anime.favourites),
+    Column('P2W', lambda anime: anime.p2w, "Plan to Watch", colour_scale=(20000, 50000, 70000)),
+    Column('Favs:P2W', lambda anime: anime.favourites_per_100_p2w(), FAV_TO_P2W_COMMENT, hidden=True),
+    Column('Type', lambda anime: anime.sequel_type, hidden=True),
+    Column('Season', lambda anime: anime.season, hidden=True),
+    Column('P Completed', lambda anime: anime.prequel.completed, "Users Completed last part", colour_scale=(50000, 100000, 200000)),
+    Column('P Watching', lambda anime: anime.prequel.watching, "Users Watching last part"),
+    Column('P Dropped', lambda anime: anime.prequel.dropped, "Users Dropped last part", hidden=True),
+    Column('P Drop Rate', lambda anime: anime.prequel.get_drop_rate(), "Of last part: Dropped / (Dropped + Completed + Watching) * 100", hidden=True),
+    Column('P Rating', lambda anime: anime.prequel.rating, "Rating of last part", colour_scale=(6.5, 7.5, 8.5)),
+    Column('P Title', lambda anime: anime.prequel.title, hidden=True, link=lambda anime: anime.prequel.get_mal_link()),
+    Column('P air', lambda anime: anime.prequel_airing),
+]
+
+PREDICTED_COLUMN = Column('Predicted Pts', lambda anime: round(anime.predicted_points), "FAL points predicted from the pre-season statistics by prediction_model")
+
+def with_prediction(columns, predicted):
+    """
+    Adds the predicted points after the title, for frames scored by a PredictionModel.
+    """
+    return columns[:1] + [PREDICTED_COLUMN] + columns[1:] if predicted else columns
+
+def calibrate(columns, category, thresholds=None):
+    """
+    Sets the colour scales of a category's columns to the thresholds calibrated on past seasons, if any.
+    """
+    return thresholds.apply(columns, category) if thresholds else columns
+
+def create_originals_sheet(workbook, originals_list, predicted=False, thresholds=None):
+    columns = calibrate(with_prediction(ORIGINAL_COLUMNS, predicted), 'original', thresholds)
+    return render_sheet(workbook, "Originals", columns, originals_list)
+
+def create_adaptations_sheet(workbook, adaptations_list, predicted=False, thresholds=None):
+    columns = calibrate(with_prediction(ADAPTATION_COLUMNS, predicted), 'adaptation', thresholds)
+    return render_sheet(workbook, "Adaptations", columns, adaptations_list)
+
+def create_sequels_sheet(workbook, sequels_list, predicted=False, thresholds=None):
+    columns = calibrate(with_prediction(SEQUEL_COLUMNS, predicted), 'sequel', thresholds)
+    return render_sheet(workbook, "Sequels", columns, sequels_list)
+
+def add_predictions(model, frames):
+    """
+    Scores every frame with a model of its category as a predicted_points column.
+
+    Parameters:
+    model: The trained PredictionModel.
+    frames: The SeasonFrame of each category.
+
+    Returns:
+    set: The categories that were scored.
+    """
+    for category, frame in frames.items():
+        if category in model:
+            frame.columns['predicted_points'] = model.predict(frame, category)
+    return {category for category, frame in frames.items() if 'predicted_points' in frame.columns}
+
+
+def read_season_sheet_ids(filename):
+    """
+    Reads the anime ids from the id column of a sheet written by season_scraper.
+    """
+    sheet = load_workbook(filename, read_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    id_column = next(rows).index('id')
+    return [row[id_column] for row in rows if row[id_column] is not None]
+
+def main(anime_ids=None):
+    """
+    Writes the originals, adaptations and sequels sheets.
+
+    Parameters:
+    anime_ids: IDs of the shows of the season. When given, each show is classified
+        automatically from its relations instead of using the lists below.
+    """
     originals = [
         54028,
         61150,
@@ -389,23 +211,88 @@ def main():
         (59342, 2012)
     ]
 
-    sequels_list = [create_sequel_anime(anime_id, prequel_id) for anime_id, prequel_id in sequels]
-    originals_list = [create_anime(anime_id) for anime_id in originals]
-    adaptations_list = [create_adapted_anime(anime_id, manga_id) for anime_id, manga_id in adaptations]
+    # keep the statistics of every fetched show in the local history
+    store = SnapshotStore()
+    mal_client.subscribe(store.record)
+    # and the relations, so known prequel chains are not walked again over the API
+    graph = RelationGraph()
+    mal_client.subscribe(graph.record)
+    mal_client.subscribe(TitleIndex().record)
+
+    # fetch every unique anime and manga once, shared between the three lists
+    coalescer = RequestCoalescer(fetch_anime_data, fetch_manga_data)
+    if anime_ids:
+        originals, adaptations, sequels = RelationClassifier(coalescer, graph).classify(anime_ids)
+        print(f"originals = {originals}\nadaptations = {adaptations}\nsequels = {sequels}")
+    # the lineup lets prediction_model pair these shows with their snapshots once the season is scored
+    store.record_lineup('original', [(anime_id, None) for anime_id in originals])
+    store.record_lineup('adaptation', adaptations)
+    store.record_lineup('sequel', sequels)
+
+    # ranked manga are read from the local ranking, refreshed when it is older than a week
+    manga_index = MangaRankIndex()
+    manga_index.refresh()
+    coalescer.prefetch(
+        [('anime', anime_id, field_profiles.ANIME) for anime_id, _ in sequels] +
+        [('anime', prequel_id, field_profiles.PREQUEL) for _, prequel_id in sequels] +
+        [('anime', anime_id, field_profiles.ANIME) for anime_id in originals] +
+        [('anime', anime_id, field_profiles.ANIME) for anime_id, _ in adaptations] +
+        [('manga', manga_id, field_profiles.MANGA) for _, manga_id in adaptations if manga_id not in manga_index]
+    )
+
+    sequel_data = [coalescer.anime(anime_id, field_profiles.ANIME) for anime_id, _ in sequels]
+    prequel_data = [coalescer.anime(prequel_id, field_profiles.PREQUEL) for _, prequel_id in sequels]
+    original_data = [coalescer.anime(anime_id, field_profiles.ANIME) for anime_id in originals]
+    adaptation_data = [coalescer.anime(anime_id, field_profiles.ANIME) for anime_id, _ in adaptations]
+    manga_data = [get_manga_data(manga_id, coalescer, manga_index) for _, manga_id in adaptations]
+    # ranked manga are not fetched, so their ranking entry goes into the history, dated when the ranking was
+    # fetched; a manga is only written once per refresh of the ranking
+    if manga_index.refreshed_at:
+        ranked_at = manga_index.refreshed_at.strftime("%Y-%m-%d %H:%M:%S")
+        for _, manga_id in adaptations:
+            latest = store.latest_manga(manga_id)
+            if manga_id in manga_index and (latest is None or latest['fetched_at'] < ranked_at):
+                store.record('manga', manga_index.get_payload(manga_id), ranked_at)
+
+    # one columnar frame per type; the derived ratios are computed for the whole frame at once
+    with instrumentation.stage('models'):
+        frames = {
+            'original': SeasonFrame.from_payloads(original_data),
+            'adaptation': SeasonFrame.from_payloads(
+                adaptation_data, manga_data=manga_data, total_manga=manga_index.total or TOTAL_MANGA
+            ),
+            'sequel': SeasonFrame.from_payloads(sequel_data, prequel_data=prequel_data),
+        }
+        # scored as whole frames by the model trained on past seasons, when there is one
+        predicted = add_predictions(PredictionModel.load(), frames)
+        originals_list = frames['original'].rows()
+        adaptations_list = frames['adaptation'].rows()
+        sequels_list = frames['sequel'].rows()
     # light_novels_list = [create_adapted_anime(anime_id, manga_id) for anime_id, manga_id in LNs]
 
-    workbook = Workbook()
-    workbook.remove(workbook.active)  # Remove the default sheet
+    # colour scales follow the recorded past seasons, recomputed when older than a week
+    thresholds = ColourThresholds()
+    thresholds.refresh(store, total_manga=manga_index.total or TOTAL_MANGA)
+
+    workbook = create_workbook()
 
-    create_originals_sheet(workbook, originals_list)
-    create_adaptations_sheet(workbook, adaptations_list)
+    create_originals_sheet(workbook, originals_list, 'original' in predicted, thresholds)
+    create_adaptations_sheet(workbook, adaptations_list, 'adaptation' in predicted, thresholds)
     # create_adaptations_sheet(workbook, light_novels_list)
-    create_sequels_sheet(workbook, sequels_list)
+    create_sequels_sheet(workbook, sequels_list, 'sequel' in predicted, thresholds)
 
     now = datetime.datetime.now()
     timestamp = now.strftime("%Y-%m-%d-%H-%M")
     filename = f"FAL_typed_data_{timestamp}.xlsx"
-    workbook.save(filename)
+    with instrumentation.stage('save'):
+        workbook.save(filename)
+    instrumentation.report_run()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Writes the originals, adaptations and sequels sheets.")
+    parser.add_argument("ids", nargs="*", type=int, help="ids of the shows to classify automatically")
+    parser.add_argument("--season-sheet", help="classify every show of a sheet written by season_scraper")
+    args = parser.parse_args()
+    instrumentation.configure_logging()
+    anime_ids = args.ids + (read_season_sheet_ids(args.season_sheet) if args.season_sheet else [])
+    main(anime_ids)
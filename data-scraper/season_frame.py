@@ -0,0 +1,251 @@
+"""
+columnar, NumPy backed season table.
+
+SeasonFrame holds the statistics of many anime (and optionally their source manga
+or prequel) as one array per field and computes every derived ratio for the whole
+season at once. rows() yields views with the same attributes and methods as the
+models in anime_data_model, so a frame renders with the existing sheet columns.
+"""
+
+import numpy as np
+from anime_data_model import TOTAL_MANGA
+
+ANIME_COLUMNS = ('id', 'favourites', 'p2w', 'watching', 'completed', 'dropped', 'rating')
+MANGA_COLUMNS = ('manga_id', 'manga_favourite', 'manga_score', 'manga_num_list_users', 'manga_rank')
+
+
+def safe_ratio(numerator: np.ndarray, denominator: np.ndarray, scale: float = 100) -> np.ndarray:
+    """
+    Returns numerator / denominator * scale, with 0 wherever the denominator is 0.
+    """
+    ratio = np.zeros(len(numerator), dtype=float)
+    np.divide(numerator, denominator, out=ratio, where=denominator != 0)
+    return ratio * scale
+
+
+def get_anime_columns(anime_list: list, prefix: str = "") -> dict:
+    """
+    Extracts the columns read by Anime from a list of MAL API anime payloads.
+    """
+    columns = {
+        'id': [anime['id'] for anime in anime_list],
+        'title': [anime['title'] for anime in anime_list],
+        'favourites': [anime['num_favorites'] for anime in anime_list],
+        'p2w': [anime['statistics']['status']['plan_to_watch'] for anime in anime_list],
+        'watching': [anime['statistics']['status']['watching'] for anime in anime_list],
+        'completed': [anime['statistics']['status']['completed'] for anime in anime_list],
+        'dropped': [anime['statistics']['status']['dropped'] for anime in anime_list],
+        'rating': [anime.get('mean') or -1 for anime in anime_list],
+        'source': [anime.get('source') for anime in anime_list],
+    }
+    return {prefix + name: _to_array(name, values) for name, values in columns.items()}
+
+
+def get_manga_columns(manga_list: list) -> dict:
+    """
+    Extracts the columns read by AdaptedAnime from a list of MAL API manga payloads.
+    """
+    columns = {
+        'manga_id': [manga['id'] for manga in manga_list],
+        'manga_favourite': [manga['num_favorites'] for manga in manga_list],
+        'manga_score': [manga.get('mean') or 0 for manga in manga_list],
+        'manga_num_list_users': [manga['num_list_users'] for manga in manga_list],
+        'manga_rank': [manga.get('rank') or -1 for manga in manga_list],
+        'manga_type': [manga['media_type'] for manga in manga_list],
+    }
+    return {name: _to_array(name, values) for name, values in columns.items()}
+
+
+def get_row_columns(rows: list, prefix: str = "") -> dict:
+    """
+    Extracts the same columns as get_anime_columns from stored anime rows, e.g. SnapshotStore snapshots.
+    """
+    columns = {
+        'id': [row['anime_id'] for row in rows],
+        'title': [row['title'] for row in rows],
+        'favourites': [row['num_favorites'] or 0 for row in rows],
+        'p2w': [row['plan_to_watch'] or 0 for row in rows],
+        'watching': [row['watching'] or 0 for row in rows],
+        'completed': [row['completed'] or 0 for row in rows],
+        'dropped': [row['dropped'] or 0 for row in rows],
+        'rating': [row['mean'] or -1 for row in rows],
+        'source': [row['source'] for row in rows],
+    }
+    return {prefix + name: _to_array(name, values) for name, values in columns.items()}
+
+
+def get_manga_row_columns(rows: list) -> dict:
+    """
+    Extracts the same columns as get_manga_columns from stored manga rows.
+    """
+    columns = {
+        'manga_id': [row['manga_id'] for row in rows],
+        'manga_favourite': [row['num_favorites'] or 0 for row in rows],
+        'manga_score': [row['mean'] or 0 for row in rows],
+        'manga_num_list_users': [row['num_list_users'] or 0 for row in rows],
+        'manga_rank': [row['rank'] or -1 for row in rows],
+        'manga_type': [row['media_type'] for row in rows],
+    }
+    return {name: _to_array(name, values) for name, values in columns.items()}
+
+
+def _to_array(name: str, values: list) -> np.ndarray:
+    if name in ANIME_COLUMNS or name in MANGA_COLUMNS:
+        dtype = float if name in ('rating', 'manga_score') else np.int64
+        return np.array(values, dtype=dtype)
+    return np.array(values, dtype=object)
+
+
+class SeasonFrame:
+    def __init__(self, columns: dict, total_manga: int = TOTAL_MANGA) -> None:
+        """
+        columns - array of each field by name, all of the same length.
+            Anime fields are named as on Anime, manga fields as on AdaptedAnime and
+            prequel fields are the Anime names prefixed with prequel_
+        total_manga - number of manga with a score the manga percentiles are relative to
+        """
+        self.columns = columns
+        self.total_manga = total_manga
+        self.derived = {}
+
+    @classmethod
+    def from_payloads(cls, anime_data: list, manga_data: list = None, prequel_data: list = None, sequel_types: list = None, seasons: list = None,
+                      total_manga: int = TOTAL_MANGA):
+        """
+        Builds a frame from MAL API payloads.
+
+        Parameters:
+        anime_data: The anime payloads.
+        manga_data: The source manga payload of each anime, for adaptations.
+        prequel_data: The prequel payload of each anime, for sequels.
+        sequel_types: The type of each sequel (part 2, season 2, spin-off, etc.).
+        seasons: The season of each sequel (1, 2, 2.5, etc.).
+        total_manga: The number of manga with a score, e.g. MangaRankIndex.total.
+        """
+        columns = get_anime_columns(anime_data)
+        if manga_data is not None:
+            columns.update(get_manga_columns(manga_data))
+        if prequel_data is not None:
+            columns.update(get_anime_columns(prequel_data, "prequel_"))
+            columns['prequel_airing'] = np.array([
+                prequel['start_season']['season'] + str(prequel['start_season']['year']) for prequel in prequel_data
+            ], dtype=object)
+            columns['sequel_type'] = np.array(sequel_types or [-1] * len(prequel_data), dtype=object)
+            columns['season'] = np.array(seasons or ["unknown"] * len(prequel_data), dtype=object)
+        return cls(columns, total_manga)
+
+    @classmethod
+    def from_rows(cls, anime_rows: list, manga_rows: list = None, prequel_rows: list = None, total_manga: int = TOTAL_MANGA):
+        """
+        Builds a frame from stored rows, e.g. SnapshotStore snapshots of past seasons.
+        The arguments are as for from_payloads, with rows in place of payloads.
+        """
+        columns = get_row_columns(anime_rows)
+        if manga_rows is not None:
+            columns.update(get_manga_row_columns(manga_rows))
+        if prequel_rows is not None:
+            columns.update(get_row_columns(prequel_rows, "prequel_"))
+            columns['prequel_airing'] = np.array([row['start_season'] for row in prequel_rows], dtype=object)
+            columns['sequel_type'] = np.array([-1] * len(prequel_rows), dtype=object)
+            columns['season'] = np.array(["unknown"] * len(prequel_rows), dtype=object)
+        return cls(columns, total_manga)
+
+    @classmethod
+    def concat(cls, frames: list):
+        """
+        Stacks frames with the same fields, e.g. several seasons, into one.
+        """
+        names = frames[0].columns.keys()
+        return cls({name: np.concatenate([frame.columns[name] for frame in frames]) for name in names}, frames[0].total_manga)
+
+    def __len__(self) -> int:
+        return len(self.columns['id'])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def _derive(self, name: str, compute) -> np.ndarray:
+        if name not in self.derived:
+            self.derived[name] = compute()
+        return self.derived[name]
+
+    def favourites_per_100_p2w(self, prefix: str = "") -> np.ndarray:
+        return self._derive(prefix + 'favourites_per_100_p2w', lambda: safe_ratio(
+            self.columns[prefix + 'favourites'], self.columns[prefix + 'p2w']
+        ))
+
+    def drop_rate(self, prefix: str = "") -> np.ndarray:
+        def compute():
+            total = self.columns[prefix + 'dropped'] + self.columns[prefix + 'completed'] + self.columns[prefix + 'watching']
+            return safe_ratio(self.columns[prefix + 'dropped'], total)
+        return self._derive(prefix + 'drop_rate', compute)
+
+    def manga_percentile(self) -> np.ndarray:
+        return self._derive('manga_percentile', lambda: np.where(
+            (self.columns['manga_score'] > 0) & (self.columns['manga_rank'] > 0),
+            np.clip((1 - self.columns['manga_rank'] / self.total_manga) * 100, 0, 100),
+            -1.0
+        ))
+
+    def favourite_to_num_list_users(self) -> np.ndarray:
+        return self._derive('favourite_to_num_list_users', lambda: safe_ratio(
+            self.columns['manga_favourite'], self.columns['manga_num_list_users']
+        ))
+
+    def rows(self):
+        """
+        Yields a view of each row that behaves like Anime, AdaptedAnime or SequelAnime,
+        depending on the fields of the frame.
+        """
+        values = {name: column.tolist() for name, column in self.columns.items()}
+        derived = {'favourites_per_100_p2w': self.favourites_per_100_p2w(), 'drop_rate': self.drop_rate()}
+        if 'manga_id' in self.columns:
+            derived['manga_percentile'] = self.manga_percentile()
+            derived['favourite_to_num_list_users'] = self.favourite_to_num_list_users()
+        if 'prequel_id' in self.columns:
+            derived['prequel_favourites_per_100_p2w'] = self.favourites_per_100_p2w('prequel_')
+            derived['prequel_drop_rate'] = self.drop_rate('prequel_')
+        derived = {name: column.tolist() for name, column in derived.items()}
+        for index in range(len(self)):
+            yield FrameRow(values, derived, index)
+
+
+class FrameRow:
+    __slots__ = ('values', 'derived', 'index', 'prefix')
+
+    def __init__(self, values: dict, derived: dict, index: int, prefix: str = "") -> None:
+        self.values = values
+        self.derived = derived
+        self.index = index
+        self.prefix = prefix
+
+    def __getattr__(self, name: str):
+        try:
+            return self.values[self.prefix + name][self.index]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def prequel(self):
+        return FrameRow(self.values, self.derived, self.index, "prequel_")
+
+    def favourites_per_100_p2w(self) -> float:
+        return self.derived[self.prefix + 'favourites_per_100_p2w'][self.index]
+
+    def get_drop_rate(self) -> float:
+        return self.derived[self.prefix + 'drop_rate'][self.index]
+
+    def get_manga_percentile(self) -> float:
+        return self.derived['manga_percentile'][self.index]
+
+    def get_favourite_to_num_list_users(self) -> float:
+        return self.derived['favourite_to_num_list_users'][self.index]
+
+    def get_mal_link(self) -> str:
+        return f"https://myanimelist.net/anime/{self.id}"
+
+    def get_manga_link(self) -> str:
+        return f"https://myanimelist.net/manga/{self.manga_id}"
+
+    def __repr__(self) -> str:
+        return f"{self.title}"
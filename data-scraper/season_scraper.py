@@ -2,27 +2,22 @@
 scrapes every show in the upcoming season.
 """
 
-import requests
-from dotenv import load_dotenv
+import logging
 import os
 from datetime import datetime
+import mal_client
+import instrumentation
+from snapshot_store import SnapshotStore
+from relation_graph import RelationGraph, PREQUEL_RELATIONS
+from title_index import TitleIndex
+import field_profiles
 from anime_data_model import Anime
-from openpyxl import Workbook
-from openpyxl.comments import Comment
-from openpyxl.styles import Alignment, Font
-from openpyxl.utils import get_column_letter
+from sheet_writer import Column, create_workbook, render_sheet
 
-MAX_VALUE_FOR_LIMIT = 500
-FIELDS = "mean, " \
-"num_favorites, " \
-"statistics, " \
-"source, " \
-"related_anime," \
-"related_manga," \
-"media_type"
+logger = logging.getLogger(__name__)
 
-load_dotenv()
-CLIENT_ID = os.getenv("CLIENT_ID")
+MAX_VALUE_FOR_LIMIT = 500
+FIELDS = field_profiles.SEASON
 
 def get_upcoming_season() -> str:
     """
@@ -58,21 +53,14 @@ def fetch_anime_data(anime_id: int, field: str) -> dict:
     Returns:
     dict: The data for the anime from the MyAnimeList API.
     """
-    url = f'https://api.myanimelist.net/v2/anime/{anime_id}?fields={field}'
-    response = requests.get(url, headers={'X-MAL-CLIENT-ID': CLIENT_ID})
-    response.raise_for_status()
-    anime_data = response.json()
-    response.close()
-    try:
-        print(anime_data)
-    except:
-        print("can't print")
+    anime_data = mal_client.fetch_anime_data(anime_id, field)
+    logger.debug("%s", anime_data)
     return anime_data
 
 
 def get_related_anime_id(anime: dict) -> tuple[int, str]:
     """
-    Get the ID of the related anime.
+    Get the ID of the related anime, preferring a prequel over the other relations.
 
     Parameters:
     anime: The anime data.
@@ -80,8 +68,13 @@ def get_related_anime_id(anime: dict) -> tuple[int, str]:
     Returns:
     tuple[int, str]: The ID of the related anime and the relation type.
     """
+    related_anime = anime.get('related_anime') or []
+    for relation_type in PREQUEL_RELATIONS:
+        for related in related_anime:
+            if related['relation_type'] == relation_type:
+                return (related['node']['id'], relation_type)
     try:
-        return (anime['related_anime'][0]['node']['id'], anime['related_anime'][0]['relation_type'])
+        return (related_anime[0]['node']['id'], related_anime[0]['relation_type'])
     except (KeyError, TypeError, IndexError):
         return (-1, "")
 
@@ -101,31 +94,51 @@ def get_related_anime_id(anime: dict) -> tuple[int, str]:
 #     except (KeyError, TypeError, IndexError):
 #         return (-1, "")
 
-def fetch_anime_season_data(year: int, season: str, add_ids = [], unused_ids = []) -> [Anime, tuple[int, str]]:
+def iter_anime_season_data(year: int, season: str, add_ids = [], unused_ids = [], max_workers: int = mal_client.MAX_WORKERS, media_type: str = 'tv'):
     """
-    Fetches the data for all the anime in a given season from the MyAnimeList API.
+    Streams the data for all the anime in a given season from the MyAnimeList API.
+
+    The season listing is paged through and filtered on its media_type before any
+    detail is fetched, and each anime is yielded as soon as its details arrive.
 
     Parameters:
     year: The year of the season.
     season: The season to fetch the anime for.
-
-    Returns:
-    [Anime, tuple[int, str]: The data for all the anime in
-        the given season from the MyAnimeList API.
-        where tuple[int, str] is the related anime id and the relation type.
-
+    add_ids: IDs of anime to add that the season listing misses.
+    unused_ids: IDs of anime in the season listing to skip.
+    max_workers: The number of anime fetched in parallel.
+    media_type: The media type to keep.
+
+    Yields:
+    (Anime, tuple[int, str]): The anime, in listing order followed by add_ids,
+        and its related anime id and relation type.
     """
-    url = f'https://api.myanimelist.net/v2/anime/season/{year}/{season}?limit={MAX_VALUE_FOR_LIMIT}'
-    response = requests.get(url, headers={'X-MAL-CLIENT-ID': CLIENT_ID})
-    response.raise_for_status()
-    anime_season_data = response.json()
-    response.close()
-    seasonal_list = [
-        fetch_anime_data(anime['node']['id'], FIELDS)
-        for anime in anime_season_data['data'] if anime['node']['id'] not in unused_ids
-    ] + [fetch_anime_data(add_id, FIELDS) for add_id in add_ids]
-    anime_list = [(Anime(anime), get_related_anime_id(anime)) for anime in seasonal_list if anime['media_type'] == 'tv']
-    return anime_list
+    def get_anime_ids():
+        for anime in mal_client.iter_season(year, season, MAX_VALUE_FOR_LIMIT, 'media_type'):
+            if anime['id'] not in unused_ids and anime.get('media_type', media_type) == media_type:
+                yield anime['id']
+        yield from add_ids
+
+    for anime in mal_client.iter_concurrently(
+        lambda anime_id: fetch_anime_data(anime_id, FIELDS), get_anime_ids(), max_workers
+    ):
+        if anime['media_type'] == media_type:
+            with instrumentation.stage('models'):
+                anime_with_relation = (Anime(anime), get_related_anime_id(anime))
+            yield anime_with_relation
+
+
+SEASON_COLUMNS = [
+    Column('Title', lambda row: row[0].title, link=lambda row: row[0].get_mal_link()),
+    Column('Favourites', lambda row: row[0].favourites),
+    Column('P2W', lambda row: row[0].p2w, "Plan to Watch"),
+    Column('Favs:P2W', lambda row: row[0].favourites_per_100_p2w(), "Favourite to Plan to Watch. Favourites/Plan to Watch * 100"),
+    Column('Watching', lambda row: row[0].watching),
+    Column('id', lambda row: row[0].id),
+    Column('Source', lambda row: row[0].source),
+    Column('Prequel id', lambda row: row[1][0], link=lambda row: f"https://myanimelist.net/anime/{row[1][0]}"),
+    Column('Relation2Prequel', lambda row: row[1][1]),
+]
 
 
 def create_sheet(workbook: str, anime_list: [Anime, tuple[int, str]]) -> None:
@@ -136,41 +149,20 @@ def create_sheet(workbook: str, anime_list: [Anime, tuple[int, str]]) -> None:
     workbook: The workbook to create the sheet in.
     anime_list: The list of anime data to add to the sheet.
     """
-    TITLE = 1
-    FAVOURITE = 2
-    PLAN_TO_WATCH = 3
-    FAV_TO_P2W = 4
-    WATCHING = 5
-    ID = 6
-    SOURCE = 7
-    PREQUEL_ID = 8
-    RELATION_TO_PREQUEL = 9
-
-    headers = ['Title', 'Favourites', 'P2W', 'Favs:P2W', 'Watching', 'id', 'Source', 'Prequel id', 'Relation2Prequel']
-    sheet = workbook.active
-
-    for i, header in enumerate(headers):
-        sheet.cell(1, i+1).value = header
-        sheet.cell(1, i+1).alignment = Alignment(horizontal='center')
-        sheet.cell(1, i+1).font = Font(bold=True)
-        sheet.freeze_panes = 'B2'
-
-    for j, (anime, prequel) in enumerate(anime_list):
-        sheet.cell(j+2, TITLE).value = anime.title
-        sheet.cell(j+2, FAVOURITE).value = anime.favourites
-        sheet.cell(j+2, PLAN_TO_WATCH).value = anime.p2w
-        sheet.cell(j+2, FAV_TO_P2W).value = anime.favourites_per_100_p2w()
-        sheet.cell(j+2, WATCHING).value = anime.watching
-        sheet.cell(j+2, ID).value = anime.id
-        sheet.cell(j+2, SOURCE).value = anime.source
-        sheet.cell(j+2, PREQUEL_ID).value = prequel[0]
-        sheet.cell(j+2, RELATION_TO_PREQUEL).value = prequel[1]
-
-        sheet.cell(j+2, TITLE).hyperlink = anime.get_mal_link()
-        sheet.cell(j+2, PREQUEL_ID).hyperlink = f"https://myanimelist.net/anime/{prequel[0]}"
-
-    sheet[get_column_letter(PLAN_TO_WATCH) + '1'].comment = Comment("Plan to Watch", "Author")
-    sheet[get_column_letter(FAV_TO_P2W) + '1'].comment = Comment("Favourite to Plan to Watch. Favourites/Plan to Watch * 100", "Author")
+    render_sheet(workbook, "Sheet", SEASON_COLUMNS, anime_list)
+
+
+def print_each(anime_list):
+    """
+    Prints every anime as it passes through.
+    """
+    for anime in anime_list:
+        try:
+            print(anime)
+        except UnicodeEncodeError:
+            print("Cannot print this anime due to encoding issues")
+            pass
+        yield anime
 
 
 def main():
@@ -203,23 +195,26 @@ def main():
         60505
     ]
 
+    # keep the statistics of every fetched show in the local history
+    mal_client.subscribe(SnapshotStore().record)
+    # and index their relations for the typed-data classification
+    mal_client.subscribe(RelationGraph().record)
+    # and their titles, to join the weekly rankings with the MAL IDs
+    mal_client.subscribe(TitleIndex().record)
+
     year = datetime.now().year
     upcoming_season = get_upcoming_season()
-    anime_list = fetch_anime_season_data(year, upcoming_season, add_ids, remove_ids)
-    for anime in anime_list:
-        try:
-            print(anime)
-        except UnicodeEncodeError:
-            print("Cannot print this anime due to encoding issues")
-            pass
+    # the sheet is written while the remaining anime are still being fetched
+    anime_list = print_each(iter_anime_season_data(year, upcoming_season, add_ids, remove_ids))
 
-    workbook = Workbook()
+    workbook = create_workbook()
     create_sheet(workbook, anime_list)
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(script_dir, "data")
-    filename = os.path.join(data_dir, f"{upcoming_season}{year}{'_fal'*for_fal}_shows.xlsx")
-    workbook.save(filename)
+    filename = os.path.join(mal_client.DATA_DIR, f"{upcoming_season}{year}{'_fal'*for_fal}_shows.xlsx")
+    with instrumentation.stage('save'):
+        workbook.save(filename)
+    instrumentation.report_run()
 
 if __name__ == "__main__":
+    instrumentation.configure_logging()
     main()
@@ -0,0 +1,184 @@
+"""
+streaming worksheet writer shared by the scrapers.
+
+Sheets are written with openpyxl's write-only mode: each row is appended once and
+flushed, so memory does not grow with the number of cells. Header styling,
+comments, hidden columns and colour scales are applied in one batch per sheet.
+
+Sheets are described declaratively as a list of Column specs and produced by
+render_sheet, so adding a metric is a one line change.
+"""
+
+from itertools import islice
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.comments import Comment
+from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
+import instrumentation
+
+RED = 'FF9999'
+YELLOW = 'FFFF99'
+GREEN = '99FF99'
+COMMENT_AUTHOR = "Author"
+HEADER_FONT = Font(bold=True)
+HEADER_ALIGNMENT = Alignment(horizontal='center')
+BOLD_FONT = Font(bold=True)
+CHUNK_SIZE = 256 # rows whose columns are computed together by render_sheet
+
+
+def create_workbook() -> Workbook:
+    """
+    Returns an empty write-only workbook. Sheets are added with SheetWriter.
+    """
+    return Workbook(write_only=True)
+
+
+def colour_scale(start: float, mid: float, end: float) -> ColorScaleRule:
+    """
+    Returns a red to yellow to green colour scale through the given values.
+    """
+    return ColorScaleRule(
+        start_type='num', start_value=start, start_color=RED,
+        mid_type='num', mid_value=mid, mid_color=YELLOW,
+        end_type='num', end_value=end, end_color=GREEN
+    )
+
+
+class SheetWriter:
+    def __init__(self, workbook, title: str, headers: list, comments: dict = None, hidden=(), colour_scales: dict = None, freeze_panes: str = 'B2') -> None:
+        """
+        workbook - write-only workbook the sheet is added to
+        title - name of the sheet
+        headers - header of each column
+        comments - header comment by column number (1 based)
+        hidden - column numbers to hide
+        colour_scales - (start, mid, end) colour scale thresholds by column number
+        freeze_panes - top left cell that is not frozen
+        """
+        self.sheet = workbook.create_sheet(title=title)
+        self.colour_scales = colour_scales or {}
+        self.num_rows = 0
+
+        # sheet views and column dimensions are written before the first row
+        self.sheet.freeze_panes = freeze_panes
+        for column in hidden:
+            self.sheet.column_dimensions[get_column_letter(column)].hidden = True
+
+        comments = comments or {}
+        header_row = []
+        for column, header in enumerate(headers, start=1):
+            cell = WriteOnlyCell(self.sheet, value=header)
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
+            if column in comments:
+                cell.comment = Comment(comments[column], COMMENT_AUTHOR)
+            header_row.append(cell)
+        self.sheet.append(header_row)
+
+    def append(self, values: list, hyperlinks: dict = None, bold=()) -> None:
+        """
+        Appends a row.
+
+        Parameters:
+        values: The value of each column.
+        hyperlinks: Link by column number (1 based).
+        bold: Column numbers written in bold.
+        """
+        if hyperlinks or bold:
+            values = list(values)
+            for column in set(hyperlinks or ()) | set(bold):
+                cell = WriteOnlyCell(self.sheet, value=values[column - 1])
+                if hyperlinks and column in hyperlinks:
+                    cell.hyperlink = hyperlinks[column]
+                if column in bold:
+                    cell.font = BOLD_FONT
+                values[column - 1] = cell
+        self.sheet.append(values)
+        self.num_rows += 1
+
+    def close(self):
+        """
+        Applies the colour scales to the written rows. A sheet without rows gets none.
+
+        Returns:
+        The worksheet.
+        """
+        if not self.num_rows:
+            return self.sheet
+        for column, (start, mid, end) in self.colour_scales.items():
+            column_letter = get_column_letter(column)
+            cell_range = f"{column_letter}2:{column_letter}{self.num_rows + 1}"
+            self.sheet.conditional_formatting.add(cell_range, colour_scale(start, mid, end))
+        return self.sheet
+
+
+class Column:
+    def __init__(self, header: str, value, comment: str = None, colour_scale: tuple = None, hidden: bool = False, link=None, bold=None) -> None:
+        """
+        header - header of the column
+        value - function returning the value of the column for a row
+        comment - comment on the header
+        colour_scale - (start, mid, end) thresholds of a red to green colour scale
+        hidden - whether the column is hidden
+        link - function returning the hyperlink of the cell for a row
+        bold - function returning whether the cell is bold for a row
+        """
+        self.header = header
+        self.value = value
+        self.comment = comment
+        self.colour_scale = colour_scale
+        self.hidden = hidden
+        self.link = link
+        self.bold = bold
+
+
+def render_sheet(workbook, title: str, columns: list, rows, chunk_size: int = CHUNK_SIZE):
+    """
+    Writes a sheet with one column per Column spec and one row per item of rows.
+
+    rows may be a generator. It is consumed in chunks; each column of a chunk is
+    computed in one pass before the chunk's rows are appended. Only the time spent
+    writing a chunk counts towards the render stage, not waiting for its rows.
+
+    Parameters:
+    workbook: The write-only workbook to add the sheet to.
+    title: The name of the sheet.
+    columns: The Column specs, in order.
+    rows: The items (e.g. Anime) to write.
+    chunk_size: The number of rows computed together.
+
+    Returns:
+    The worksheet.
+    """
+    numbered = list(enumerate(columns, start=1))
+    writer = SheetWriter(
+        workbook,
+        title,
+        [column.header for column in columns],
+        comments={number: column.comment for number, column in numbered if column.comment},
+        hidden=[number for number, column in numbered if column.hidden],
+        colour_scales={number: column.colour_scale for number, column in numbered if column.colour_scale},
+    )
+    linked = [(number, column.link) for number, column in numbered if column.link]
+    bolded = [(number, column.bold) for number, column in numbered if column.bold]
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        with instrumentation.stage('render'):
+            values = [[column.value(row) for row in chunk] for column in columns]
+            links = [(number, [link(row) for row in chunk]) for number, link in linked]
+            bolds = [(number, [bold(row) for row in chunk]) for number, bold in bolded]
+            for i, row_values in enumerate(zip(*values)):
+                writer.append(
+                    row_values,
+                    hyperlinks={number: column_links[i] for number, column_links in links},
+                    bold=[number for number, column_bolds in bolds if column_bolds[i]]
+                )
+
+    with instrumentation.stage('render'):
+        return writer.close()
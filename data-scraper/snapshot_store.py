@@ -0,0 +1,299 @@
+"""
+local SQLite history of every fetched anime and manga.
+
+Each fetch appends the payload's statistics keyed by (id, fetched_at), so the
+history of a show is one indexed query instead of one workbook per run.
+The typed scraper also records how it classified each show in lineups.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import mal_client
+
+DEFAULT_PATH = os.path.join(mal_client.DATA_DIR, "snapshots.sqlite3")
+
+ANIME_METRICS = ('mean', 'num_favorites', 'plan_to_watch', 'watching', 'completed', 'on_hold', 'dropped', 'num_list_users')
+MANGA_METRICS = ('mean', 'num_favorites', 'num_list_users', 'rank')
+ALIASES = {'score': 'mean', 'favourites': 'num_favorites', 'p2w': 'plan_to_watch'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS anime_snapshots (
+    anime_id INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL,
+    title TEXT,
+    status TEXT,
+    media_type TEXT,
+    source TEXT,
+    start_season TEXT,
+    mean REAL,
+    num_favorites INTEGER,
+    plan_to_watch INTEGER,
+    watching INTEGER,
+    completed INTEGER,
+    on_hold INTEGER,
+    dropped INTEGER,
+    num_list_users INTEGER,
+    PRIMARY KEY (anime_id, fetched_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS anime_snapshots_fetched_at ON anime_snapshots (fetched_at);
+CREATE TABLE IF NOT EXISTS manga_snapshots (
+    manga_id INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL,
+    title TEXT,
+    status TEXT,
+    media_type TEXT,
+    mean REAL,
+    num_favorites INTEGER,
+    num_list_users INTEGER,
+    rank INTEGER,
+    PRIMARY KEY (manga_id, fetched_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lineups (
+    anime_id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    related_id INTEGER,
+    recorded_at TEXT NOT NULL
+);
+"""
+
+
+def get_timestamp() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def get_column(metric: str, allowed: tuple) -> str:
+    """
+    Maps a metric name (or one of its aliases, e.g. score) to its column, rejecting anything else.
+    """
+    column = ALIASES.get(metric, metric)
+    if column not in allowed:
+        raise ValueError(f"unknown metric {metric}, expected one of {allowed}")
+    return column
+
+
+class SnapshotStore:
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        """
+        path - SQLite database file, created if it does not exist
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def record(self, endpoint: str, payload: dict, fetched_at: str = None) -> None:
+        """
+        Appends the statistics of a fetched payload. Payloads without statistics are ignored.
+
+        Parameters:
+        endpoint: The resource type (anime or manga).
+        payload: The data from the MAL API.
+        fetched_at: When the payload was fetched. Defaults to now.
+        """
+        if endpoint == 'anime':
+            self.record_anime(payload, fetched_at)
+        elif endpoint == 'manga':
+            self.record_manga(payload, fetched_at)
+
+    def record_anime(self, anime_data: dict, fetched_at: str = None) -> None:
+        if 'statistics' not in anime_data:
+            return
+        status = anime_data['statistics'].get('status', {})
+        start_season = anime_data.get('start_season')
+        row = (
+            anime_data['id'],
+            fetched_at or get_timestamp(),
+            anime_data.get('title'),
+            anime_data.get('status'),
+            anime_data.get('media_type'),
+            anime_data.get('source'),
+            f"{start_season['season']}{start_season['year']}" if start_season else None,
+            anime_data.get('mean'),
+            anime_data.get('num_favorites'),
+            _to_int(status.get('plan_to_watch')),
+            _to_int(status.get('watching')),
+            _to_int(status.get('completed')),
+            _to_int(status.get('on_hold')),
+            _to_int(status.get('dropped')),
+            _to_int(anime_data['statistics'].get('num_list_users')),
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO anime_snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+            )
+
+    def record_manga(self, manga_data: dict, fetched_at: str = None) -> None:
+        if 'num_list_users' not in manga_data and 'rank' not in manga_data:
+            return
+        row = (
+            manga_data['id'],
+            fetched_at or get_timestamp(),
+            manga_data.get('title'),
+            manga_data.get('status'),
+            manga_data.get('media_type'),
+            manga_data.get('mean'),
+            manga_data.get('num_favorites'),
+            manga_data.get('num_list_users'),
+            manga_data.get('rank'),
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO manga_snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+            )
+
+    def latest(self, anime_id: int, before: str = None):
+        """
+        Returns the most recent snapshot of an anime, optionally taken before a given time,
+        or None if it has never been recorded.
+        """
+        query = "SELECT * FROM anime_snapshots WHERE anime_id = ?"
+        params = [anime_id]
+        if before:
+            query += " AND fetched_at < ?"
+            params.append(before)
+        with self.lock:
+            return self.connection.execute(query + " ORDER BY fetched_at DESC LIMIT 1", params).fetchone()
+
+    def latest_snapshots(self, anime_ids=None, before: str = None) -> dict:
+        """
+        Returns the most recent snapshot of many anime in a single query.
+        The rows can be turned back into models with Anime.from_row.
+
+        Parameters:
+        anime_ids: The anime to include. Defaults to every recorded anime.
+        before: Only consider snapshots taken before this time.
+
+        Returns:
+        dict[int, sqlite3.Row]: The latest snapshot by anime id. Anime never recorded are missing.
+        """
+        newest = "SELECT anime_id, MAX(fetched_at) AS fetched_at FROM anime_snapshots"
+        params = []
+        if before:
+            newest += " WHERE fetched_at < ?"
+            params.append(before)
+        query = f"""
+            SELECT snapshot.* FROM anime_snapshots AS snapshot
+            JOIN ({newest} GROUP BY anime_id) AS newest
+            USING (anime_id, fetched_at)
+        """
+        if anime_ids is not None:
+            anime_ids = list(anime_ids)
+            query += f" WHERE anime_id IN ({', '.join('?' * len(anime_ids))})"
+            params += anime_ids
+        with self.lock:
+            return {row['anime_id']: row for row in self.connection.execute(query, params)}
+
+    def latest_manga(self, manga_id: int, before: str = None):
+        """
+        Returns the most recent snapshot of a manga, optionally taken before a given time,
+        or None if it has never been recorded.
+        """
+        query = "SELECT * FROM manga_snapshots WHERE manga_id = ?"
+        params = [manga_id]
+        if before:
+            query += " AND fetched_at < ?"
+            params.append(before)
+        with self.lock:
+            return self.connection.execute(query + " ORDER BY fetched_at DESC LIMIT 1", params).fetchone()
+
+    def record_lineup(self, category: str, pairs, recorded_at: str = None) -> None:
+        """
+        Records how the shows of a season were classified, so their snapshots can be
+        turned back into typed models later, e.g. to train prediction_model.
+
+        Parameters:
+        category: original, adaptation or sequel.
+        pairs: (anime_id, related_id) of each show: the source manga of an adaptation,
+            the prequel of a sequel and None for an original.
+        recorded_at: When the shows were classified. Defaults to now.
+        """
+        recorded_at = recorded_at or get_timestamp()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO lineups VALUES (?, ?, ?, ?)",
+                [(anime_id, category, related_id, recorded_at) for anime_id, related_id in pairs]
+            )
+
+    def lineups(self, category: str = None) -> list:
+        """
+        Returns the recorded (anime_id, category, related_id, recorded_at) rows, optionally of one category.
+        """
+        query = "SELECT * FROM lineups"
+        params = []
+        if category:
+            query += " WHERE category = ?"
+            params.append(category)
+        with self.lock:
+            return self.connection.execute(query + " ORDER BY anime_id", params).fetchall()
+
+    def time_series(self, anime_id: int, metrics=('watching', 'dropped', 'score')) -> list:
+        """
+        Returns the history of an anime.
+
+        Parameters:
+        anime_id: The ID of the anime.
+        metrics: The statistics to return, e.g. watching, dropped, score, p2w.
+
+        Returns:
+        list[tuple]: (fetched_at, *metrics) for every snapshot, oldest first.
+        """
+        columns = ", ".join(get_column(metric, ANIME_METRICS) for metric in metrics)
+        with self.lock:
+            return [tuple(row) for row in self.connection.execute(
+                f"SELECT fetched_at, {columns} FROM anime_snapshots WHERE anime_id = ? ORDER BY fetched_at",
+                (anime_id,)
+            )]
+
+    def series_by_anime(self, metric: str, anime_ids=None, since: str = None) -> dict:
+        """
+        Returns the history of one statistic for many anime in a single query.
+
+        Parameters:
+        metric: The statistic, e.g. watching, dropped, score.
+        anime_ids: The anime to include. Defaults to every recorded anime.
+        since: Only include snapshots taken at or after this time.
+
+        Returns:
+        dict[int, list[tuple[str, float]]]: (fetched_at, value) pairs per anime, oldest first.
+        """
+        column = get_column(metric, ANIME_METRICS)
+        query = f"SELECT anime_id, fetched_at, {column} FROM anime_snapshots WHERE 1"
+        params = []
+        if anime_ids is not None:
+            anime_ids = list(anime_ids)
+            query += f" AND anime_id IN ({', '.join('?' * len(anime_ids))})"
+            params += anime_ids
+        if since:
+            query += " AND fetched_at >= ?"
+            params.append(since)
+        series = {}
+        with self.lock:
+            for anime_id, fetched_at, value in self.connection.execute(query + " ORDER BY anime_id, fetched_at", params):
+                series.setdefault(anime_id, []).append((fetched_at, value))
+        return series
+
+    def manga_time_series(self, manga_id: int, metrics=('num_list_users', 'score', 'rank')) -> list:
+        columns = ", ".join(get_column(metric, MANGA_METRICS) for metric in metrics)
+        with self.lock:
+            return [tuple(row) for row in self.connection.execute(
+                f"SELECT fetched_at, {columns} FROM manga_snapshots WHERE manga_id = ? ORDER BY fetched_at",
+                (manga_id,)
+            )]
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _to_int(value):
+    return None if value is None else int(value)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scrapers are flat modules, imported by name as when they are run from data-scraper
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,30 @@
+from anime_data_model import Anime
+from main_season import get_changes
+
+
+def get_anime(anime_id: int, watching: int) -> Anime:
+    return Anime({
+        'id': anime_id, 'title': f"Anime {anime_id}", 'mean': 8.0, 'num_favorites': 10, 'source': 'original',
+        'statistics': {'status': {'watching': str(watching), 'completed': "0", 'dropped': "5", 'plan_to_watch': "100"}},
+    })
+
+
+def get_snapshot(watching: int) -> dict:
+    return {'watching': watching, 'dropped': 5, 'completed': 0, 'num_favorites': 10, 'plan_to_watch': 100, 'mean': 8.0}
+
+
+def test_changes_are_detected_against_the_last_snapshot():
+    anime_list = [get_anime(1, 300), get_anime(2, 300), get_anime(3, 300)]
+    previous_snapshots = {1: get_snapshot(300), 2: get_snapshot(250), 3: None}
+    baseline_snapshots = {1: get_snapshot(100), 2: get_snapshot(100), 3: None}
+
+    changed_list, deltas = get_changes(anime_list, previous_snapshots, baseline_snapshots)
+
+    # 1 did not change since the last run, however much it moved over the week
+    assert [anime.id for anime in changed_list] == [2, 3]
+    assert deltas == {2: (200, 0, 0.0)}
+
+
+def test_deltas_fall_back_to_the_last_snapshot():
+    changed_list, deltas = get_changes([get_anime(1, 300)], {1: get_snapshot(250)}, {1: None})
+    assert deltas == {1: (50, 0, 0.0)}
@@ -0,0 +1,33 @@
+import pytest
+from anime_data_model import AdaptedAnime
+from season_frame import SeasonFrame, get_manga_columns
+
+TOTAL_MANGA = 1000
+
+# (manga payload, expected percentile)
+CASES = [
+    ({'id': 1, 'num_favorites': 10, 'mean': 8.5, 'num_list_users': 100, 'rank': 100, 'media_type': 'manga'}, 90.0),
+    # unranked manga have no percentile, rather than the best one
+    ({'id': 2, 'num_favorites': 10, 'mean': 8.5, 'num_list_users': 100, 'rank': None, 'media_type': 'manga'}, -1),
+    ({'id': 3, 'num_favorites': 10, 'mean': None, 'num_list_users': 100, 'rank': 100, 'media_type': 'manga'}, -1),
+    # ranked past the counted manga, e.g. missing from an older ranking index
+    ({'id': 4, 'num_favorites': 10, 'mean': 6.0, 'num_list_users': 100, 'rank': 5000, 'media_type': 'manga'}, 0.0),
+]
+
+
+def get_anime_data(anime_id: int) -> dict:
+    return {
+        'id': anime_id, 'title': f"Anime {anime_id}", 'mean': None, 'num_favorites': 0, 'source': 'manga',
+        'statistics': {'status': {'watching': "0", 'completed': "0", 'dropped': "0", 'plan_to_watch': "0"}},
+    }
+
+
+@pytest.mark.parametrize("manga_data, expected", CASES)
+def test_adapted_anime_percentile(manga_data, expected):
+    anime = AdaptedAnime(get_anime_data(manga_data['id']), manga_data, total_manga=TOTAL_MANGA)
+    assert anime.get_manga_percentile() == pytest.approx(expected)
+
+
+def test_season_frame_percentile_matches_model():
+    frame = SeasonFrame(get_manga_columns([manga_data for manga_data, _ in CASES]), total_manga=TOTAL_MANGA)
+    assert frame.manga_percentile().tolist() == pytest.approx([expected for _, expected in CASES])
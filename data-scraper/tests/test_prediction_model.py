@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from mock_mal_server import MockMALServer
+from prediction_model import CATEGORIES, SEASON_MONTHS, build_training_set, get_pre_season_frame
+from snapshot_store import SnapshotStore
+
+DATA_SCRAPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ANIME_IDS = list(range(200000, 200012))
+
+
+def get_next_season(now: datetime) -> dict:
+    """
+    Returns the start_season of the first season starting after now.
+    """
+    for year in (now.year, now.year + 1):
+        for season, month in SEASON_MONTHS.items():
+            if datetime(year, month, 1) > now:
+                return {'year': year, 'season': season}
+
+
+def run_typed_scraper(workspace: str, base_url: str) -> None:
+    env = dict(
+        os.environ,
+        CLIENT_ID="test",
+        MAL_BASE_URL=base_url,
+        MAL_DATA_DIR=os.path.join(workspace, "data"),
+        MAL_RATE_LIMIT="0",
+        MAL_METRICS="off",
+        PYTHONPATH=DATA_SCRAPER_DIR,
+    )
+    subprocess.run(
+        [sys.executable, os.path.join(DATA_SCRAPER_DIR, "scraper_based_on_anime_type.py")] + [str(anime_id) for anime_id in ANIME_IDS],
+        cwd=workspace, env=env, check=True, capture_output=True
+    )
+
+
+def test_training_set_from_recorded_snapshots(tmp_path):
+    # the shows start next season, so the typed run is a pre-season snapshot of them
+    fixtures_dir = tmp_path / "fixtures"
+    (fixtures_dir / "anime").mkdir(parents=True)
+    for anime_id in ANIME_IDS:
+        (fixtures_dir / "anime" / f"{anime_id}.json").write_text(json.dumps({'start_season': get_next_season(datetime.now())}))
+
+    with MockMALServer(fixtures_dir=str(fixtures_dir)) as mock:
+        run_typed_scraper(str(tmp_path), mock.base_url)
+
+    with SnapshotStore(str(tmp_path / "data" / "snapshots.sqlite3")) as store:
+        for category in CATEGORIES:
+            lineup_ids = [lineup['anime_id'] for lineup in store.lineups(category)]
+            assert lineup_ids, f"no {category} recorded"
+            frame, ids = get_pre_season_frame(store, category)
+            assert ids == lineup_ids
+
+            points = {anime_id: 100.0 * (i + 1) for i, anime_id in enumerate(ids)}
+            frame, targets = build_training_set(store, points, category)
+            assert len(frame) == len(ids)
+            np.testing.assert_array_equal(targets, [points[anime_id] for anime_id in ids])
@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import pytest
+from rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+
+
+def test_burst_then_rate():
+    bucket = TokenBucket(rate=20, burst=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    start = time.monotonic()
+    assert bucket.acquire() > 0
+    assert time.monotonic() - start >= 0.04 # one token every 1/20 s
+
+
+def test_pause_blocks_every_caller():
+    bucket = TokenBucket(rate=1000, burst=5)
+    bucket.pause(0.1)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_no_rate_does_not_wait():
+    bucket = TokenBucket(rate=0)
+    assert [bucket.acquire() for _ in range(100)] == [0.0] * 100
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("3", 3.0),
+    ("-5", 0.0),
+    ("", -1),
+    (None, -1),
+    ("soon", -1),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0), # already passed
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+@pytest.mark.parametrize("zone", ["GMT", "+0000", "-0000"])
+def test_parse_retry_after_http_date(zone):
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    value = retry_at.strftime(f"%a, %d %b %Y %H:%M:%S {zone}")
+    assert 25 <= parse_retry_after(value) <= 30
+
+
+def test_parse_retry_after_other_zone():
+    retry_at = (datetime.now(timezone.utc) + timedelta(seconds=60)).astimezone(timezone(timedelta(hours=9)))
+    assert 55 <= parse_retry_after(format_datetime(retry_at)) <= 60
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        delays = [backoff_delay(attempt, base=1.0, cap=8.0) for _ in range(50)]
+        assert all(0 <= delay <= min(8.0, 2 ** attempt) for delay in delays)
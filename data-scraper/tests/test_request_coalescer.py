@@ -0,0 +1,65 @@
+import threading
+import time
+import pytest
+from field_profiles import split_fields
+from request_coalescer import RequestCoalescer
+
+
+class Fetcher:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.calls = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, resource_id: int, fields: str) -> dict:
+        with self.lock:
+            self.calls.append((resource_id, fields))
+        time.sleep(self.delay)
+        if resource_id < 0:
+            raise ValueError(resource_id)
+        return dict({field: resource_id for field in split_fields(fields)}, id=resource_id)
+
+
+def test_each_resource_is_fetched_once_with_the_union_of_fields():
+    fetch_anime, fetch_manga = Fetcher(), Fetcher()
+    coalescer = RequestCoalescer(fetch_anime, fetch_manga, max_workers=4)
+    coalescer.prefetch([('anime', 1, "mean"), ('anime', 1, "status"), ('manga', 1, "rank"), ('anime', 2, "mean")])
+
+    assert sorted(anime_id for anime_id, _ in fetch_anime.calls) == [1, 2]
+    assert split_fields(dict(fetch_anime.calls)[1]) == {'mean', 'status'}
+    assert fetch_manga.calls == [(1, "rank")]
+
+    # served from the prefetched payloads
+    assert coalescer.anime(1, "status")['status'] == 1
+    assert coalescer.manga(1, "rank")['rank'] == 1
+    assert len(fetch_anime.calls) == 2
+    assert len(coalescer) == 3
+
+
+def test_missing_fields_are_fetched_again():
+    fetch_anime = Fetcher()
+    coalescer = RequestCoalescer(fetch_anime, Fetcher())
+    coalescer.anime(1, "mean")
+    assert set(coalescer.anime(1, "status")) == {'id', 'mean', 'status'}
+    assert len(fetch_anime.calls) == 2
+
+
+def test_concurrent_requests_share_one_fetch():
+    fetch_anime = Fetcher(delay=0.05)
+    coalescer = RequestCoalescer(fetch_anime, Fetcher())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.anime(1, "mean"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(fetch_anime.calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_errors_reach_every_caller():
+    coalescer = RequestCoalescer(Fetcher(), Fetcher())
+    with pytest.raises(ValueError):
+        coalescer.anime(-1, "mean")
+    with pytest.raises(ValueError):
+        coalescer.anime(-1, "mean")
@@ -0,0 +1,55 @@
+import os
+import time
+import response_cache
+from response_cache import DAY, HOUR, ResponseCache
+
+AIRING = {'id': 1, 'status': 'currently_airing', 'mean': 8.0}
+
+
+def test_fields_are_served_from_a_wider_entry(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put('anime', 1, "mean,status", AIRING)
+    assert cache.get('anime', 1, "mean") == AIRING
+    assert cache.get('anime', 1, "mean,num_favorites") is None
+    assert cache.get('manga', 1, "mean") is None
+
+
+def test_new_fields_are_merged(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put('anime', 1, "mean,status", AIRING)
+    cache.put('anime', 1, "num_favorites,status", {'id': 1, 'status': 'currently_airing', 'num_favorites': 10})
+    assert cache.get('anime', 1, "mean,num_favorites") == dict(AIRING, num_favorites=10)
+
+
+def test_entries_expire_by_status(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), max_bytes=1 << 20)
+    now = time.time()
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now)
+    cache.put('anime', 1, "mean,status", AIRING)
+    cache.put('anime', 2, "mean,status", {'id': 2, 'status': 'finished_airing', 'mean': 7.0})
+
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now + 7 * HOUR)
+    assert cache.get('anime', 1, "mean") is None
+    assert cache.get('anime', 2, "mean") is not None
+
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now + 31 * DAY)
+    assert cache.get('anime', 2, "mean") is None
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    payload = {'id': 0, 'status': 'finished_airing', 'synopsis': "x" * 1000}
+    probe = ResponseCache(str(tmp_path / "probe"), max_bytes=1 << 20)
+    probe.put('anime', 0, "synopsis", payload)
+    entry_size = sum(probe._scan().values())
+
+    cache = ResponseCache(str(tmp_path / "cache"), max_bytes=int(entry_size * 3.5))
+    for anime_id in (1, 2, 3):
+        cache.put('anime', anime_id, "synopsis", dict(payload, id=anime_id))
+        # distinct last use times, oldest first
+        path = cache.get_path(cache.get_key('anime', anime_id))
+        os.utime(path, (anime_id * 1000, anime_id * 1000))
+    cache.get('anime', 1, "synopsis") # 1 becomes the most recently used
+
+    cache.put('anime', 4, "synopsis", dict(payload, id=4))
+    assert cache.get('anime', 2, "synopsis") is None
+    assert all(cache.get('anime', anime_id, "synopsis") is not None for anime_id in (1, 3, 4))
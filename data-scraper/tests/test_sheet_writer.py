@@ -0,0 +1,21 @@
+from openpyxl import load_workbook
+from sheet_writer import Column, create_workbook, render_sheet
+
+COLUMNS = [
+    Column('Title', lambda row: row['title']),
+    Column('P2W', lambda row: row['p2w'], colour_scale=(1000, 5000, 10000)),
+]
+
+
+def test_empty_category_is_saved(tmp_path):
+    # e.g. a season whose shows the classifier put in no adaptation
+    workbook = create_workbook()
+    render_sheet(workbook, "Adaptations", COLUMNS, [])
+    render_sheet(workbook, "Originals", COLUMNS, [{'title': "Anime 1", 'p2w': 4000}])
+    workbook.save(tmp_path / "season.xlsx")
+
+    saved = load_workbook(tmp_path / "season.xlsx")
+    assert saved["Adaptations"].max_row == 1
+    assert not saved["Adaptations"].conditional_formatting
+    assert saved["Originals"]["B2"].value == 4000
+    assert [rule.sqref for rule in saved["Originals"].conditional_formatting] == ["B2:B2"]
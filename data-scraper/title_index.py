@@ -0,0 +1,144 @@
+"""
+persistent title to MAL ID index.
+
+Maps normalized titles (the MAL title, its English and Japanese titles and synonyms)
+of every fetched show to its MAL ID, so weekly ranking rows can be joined with the
+scraped stats by title. Lookups are dict lookups; a fuzzy match is only tried for
+unknown titles and is stored, so it is not repeated on the next run.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from difflib import get_close_matches
+import mal_client
+
+DEFAULT_PATH = os.path.join(mal_client.DATA_DIR, "title_index.sqlite3")
+MIN_FUZZY_SIMILARITY = 0.9
+
+# how a title was learnt, in order of precedence: a later source never replaces an earlier one
+SOURCES = ('alias', 'title', 'alternative', 'fuzzy')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS titles (
+    normalized TEXT PRIMARY KEY,
+    anime_id INTEGER NOT NULL,
+    title TEXT,
+    source TEXT NOT NULL
+);
+"""
+
+
+def normalize_title(title: str) -> str:
+    """
+    Returns the form titles are compared in: accents, case, punctuation and repeated spaces removed.
+    e.g. "Re:ZERO -Starting Life in Another World-" -> "re zero starting life in another world"
+    """
+    title = unicodedata.normalize('NFKC', title)
+    # only Latin letters lose their accents, kana keep their voicing marks
+    title = "".join(
+        unicodedata.normalize('NFKD', char)[0] if 'LATIN' in unicodedata.name(char, "") else char for char in title
+    ).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", title).split())
+
+
+class TitleIndex:
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        """
+        path - SQLite database file, created if it does not exist
+
+        ids - anime id of each normalized title
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.sources = {}
+        for normalized, anime_id, source in self.connection.execute("SELECT normalized, anime_id, source FROM titles"):
+            self.ids[normalized] = anime_id
+            self.sources[normalized] = source
+
+    def record(self, endpoint: str, payload: dict) -> None:
+        """
+        Adds the titles of a fetched payload. Meant to be registered with mal_client.subscribe.
+        """
+        if endpoint == 'anime':
+            self.add(payload)
+
+    def add(self, anime_data: dict) -> None:
+        """
+        Indexes the title of a show, and its alternative titles if the payload has them.
+        """
+        titles = [(anime_data['title'], 'title')]
+        alternative_titles = anime_data.get('alternative_titles') or {}
+        for title in [alternative_titles.get('en'), alternative_titles.get('ja')] + (alternative_titles.get('synonyms') or []):
+            if title:
+                titles.append((title, 'alternative'))
+        self._set(anime_data['id'], titles)
+
+    def add_alias(self, title: str, anime_id: int) -> None:
+        """
+        Maps a title to a show by hand, e.g. for a show re-titled in the weekly rankings.
+        Aliases take precedence over every fetched title.
+        """
+        self._set(anime_id, [(title, 'alias')])
+
+    def _set(self, anime_id: int, titles: list) -> None:
+        rows = []
+        with self.lock:
+            for title, source in titles:
+                normalized = normalize_title(title)
+                if not normalized:
+                    continue
+                known_source = self.sources.get(normalized)
+                if known_source and SOURCES.index(known_source) < SOURCES.index(source):
+                    continue
+                self.ids[normalized] = anime_id
+                self.sources[normalized] = source
+                rows.append((normalized, anime_id, title, source))
+            if rows:
+                with self.connection:
+                    self.connection.executemany("INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?)", rows)
+
+    def lookup(self, title: str, fuzzy: bool = True) -> int:
+        """
+        Returns the MAL ID of a title.
+
+        Parameters:
+        title: The title, in any case or punctuation.
+        fuzzy: Fall back to the closest indexed title when the title is unknown.
+
+        Returns:
+        int: The anime id, or -1 if no indexed title matches.
+        """
+        normalized = normalize_title(title)
+        anime_id = self.ids.get(normalized)
+        if anime_id is not None:
+            return anime_id
+        if not fuzzy:
+            return -1
+        matches = get_close_matches(normalized, self.ids.keys(), n=1, cutoff=MIN_FUZZY_SIMILARITY)
+        if not matches:
+            return -1
+        anime_id = self.ids[matches[0]]
+        self._set(anime_id, [(title, 'fuzzy')])
+        return anime_id
+
+    def __contains__(self, title: str) -> bool:
+        return normalize_title(title) in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,220 @@
+"""
+long-running tracker of the in-season statistics of the FAL shows.
+
+The tracked shows are read from tracked_shows.json (or MAL_TRACKED_SHOWS), which is
+re-read when it changes. Airing and upcoming shows are polled every
+airing_interval_hours and finished ones every finished_interval_hours. Polls fall
+on fixed times of day, so weekly numbers are sampled at consistent times, and the
+shows are spread over spread_minutes after each of them to keep the load even.
+
+Every poll is recorded in the SnapshotStore, which is also where the schedule is
+read from: a stopped tracker picks up where it left off, and shows fetched by the
+other scrapers are not polled again until they are due.
+
+run python tracker.py, stop it with Ctrl+C or SIGTERM, or run python tracker.py --once
+from a scheduler to poll the shows that are due and exit.
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+from datetime import datetime, timedelta
+import requests
+import mal_client
+import instrumentation
+import field_profiles
+from snapshot_store import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv("MAL_TRACKED_SHOWS") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "tracked_shows.json")
+FIELDS = field_profiles.ANIME
+DEFAULTS = {
+    'season': "",
+    'airing_interval_hours': 6,
+    'finished_interval_hours': 24 * 7,
+    'spread_minutes': 30,
+    'picked_shows': [],
+}
+RETRY_DELAY = timedelta(minutes=15) # before a show whose poll failed is tried again
+MAX_SLEEP = 60 # seconds, so a changed config is noticed
+
+
+def load_config(path: str = CONFIG_PATH) -> dict:
+    """
+    Reads the tracked shows and the polling schedule.
+
+    Parameters:
+    path: The JSON config file.
+
+    Returns:
+    dict: The config, with DEFAULTS for every missing setting.
+    """
+    with open(path, encoding="utf-8") as file:
+        config = dict(DEFAULTS, **json.load(file))
+    if not isinstance(config.get('ids'), list) or not all(isinstance(anime_id, int) for anime_id in config['ids']):
+        raise ValueError(f"{path} needs an ids list of MAL anime IDs")
+    config['ids'] = list(dict.fromkeys(config['ids']))
+    return config
+
+
+def get_next_poll(last_polled: datetime, interval: timedelta, offset: timedelta) -> datetime:
+    """
+    Returns the first poll time after last_polled. Poll times are offset + n * interval
+    from the start of the day of the last poll.
+    """
+    day_start = datetime.combine(last_polled.date(), datetime.min.time())
+    slots_passed = (last_polled - day_start - offset) // interval
+    return day_start + offset + (slots_passed + 1) * interval
+
+
+class Tracker:
+    def __init__(self, config_path: str = CONFIG_PATH, store: SnapshotStore = None) -> None:
+        """
+        config_path - JSON file with the tracked ids and schedule
+        store - history the polls are recorded in and the schedule is read from
+
+        config - the loaded config, reloaded when the file changes
+        failures - when each show whose last poll failed may be tried again
+        stopping - set to finish the current poll and return from run
+        """
+        self.config_path = config_path
+        self.store = store or SnapshotStore()
+        self.config = None
+        self.config_mtime = None
+        self.failures = {}
+        self.stopping = threading.Event()
+        self.reload_config()
+
+    def reload_config(self) -> None:
+        mtime = os.path.getmtime(self.config_path)
+        if mtime == self.config_mtime:
+            return
+        try:
+            config = load_config(self.config_path)
+        except ValueError as error: # keep polling the previous shows until the file is fixed
+            if self.config is None:
+                raise
+            logger.warning("%s, keeping the previous config", error)
+            return
+        self.config = config
+        self.config_mtime = mtime
+        logger.info("tracking %s shows", len(config['ids']))
+
+    def get_schedule(self, now: datetime) -> list:
+        """
+        Returns (due, anime_id) for every tracked show, soonest first.
+        Shows that were never recorded are due now.
+        """
+        ids = self.config['ids']
+        airing_interval = timedelta(hours=self.config['airing_interval_hours'])
+        finished_interval = timedelta(hours=self.config['finished_interval_hours'])
+        spread = timedelta(minutes=self.config['spread_minutes'])
+        latest_snapshots = self.store.latest_snapshots(ids)
+
+        schedule = []
+        for position, anime_id in enumerate(ids):
+            snapshot = latest_snapshots.get(anime_id)
+            if snapshot is None:
+                due = now
+            else:
+                interval = finished_interval if snapshot['status'] == 'finished_airing' else airing_interval
+                # whole seconds, as fetched_at is recorded to the second
+                offset = timedelta(seconds=int(spread.total_seconds() * position / len(ids)))
+                due = get_next_poll(datetime.fromisoformat(snapshot['fetched_at']), interval, offset)
+            if anime_id in self.failures:
+                due = max(due, self.failures[anime_id])
+            schedule.append((due, anime_id))
+        return sorted(schedule)
+
+    def poll(self, anime_id: int) -> bool:
+        """
+        Fetches the current statistics of a show, which the store records.
+
+        Returns:
+        bool: Whether the poll succeeded. A failed show is retried after RETRY_DELAY.
+        """
+        try:
+            mal_client.fetch_anime_data(anime_id, FIELDS, use_cache=False)
+        except requests.RequestException as error:
+            logger.warning("polling %s failed: %s", anime_id, error)
+            self.failures[anime_id] = datetime.now() + RETRY_DELAY
+            return False
+        self.failures.pop(anime_id, None)
+        logger.info("polled %s", anime_id)
+        return True
+
+    def poll_due(self) -> int:
+        """
+        Polls every show that is due, one at a time within the client's rate limit.
+
+        Returns:
+        int: The number of shows polled.
+        """
+        now = datetime.now()
+        polled = 0
+        for due, anime_id in self.get_schedule(now):
+            if due > now or self.stopping.is_set():
+                break
+            polled += self.poll(anime_id)
+        return polled
+
+    def get_sleep(self) -> float:
+        """
+        Returns how long to wait before the next show is due, at most MAX_SLEEP.
+        """
+        schedule = self.get_schedule(datetime.now())
+        if not schedule:
+            return MAX_SLEEP
+        return min(max((schedule[0][0] - datetime.now()).total_seconds(), 0), MAX_SLEEP)
+
+    def run(self, once: bool = False) -> None:
+        """
+        Polls the shows as they fall due until stop is called.
+
+        Parameters:
+        once: Poll the shows that are due now and return.
+        """
+        mal_client.subscribe(self.store.record)
+        try:
+            while not self.stopping.is_set():
+                self.reload_config()
+                self.poll_due()
+                if once:
+                    break
+                self.stopping.wait(self.get_sleep())
+        finally:
+            mal_client.unsubscribe(self.store.record)
+
+    def stop(self, *_) -> None:
+        """
+        Stops after the poll in progress. Usable as a signal handler.
+        """
+        self.stopping.set()
+
+    def close(self) -> None:
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Polls the statistics of the tracked FAL shows on a schedule.")
+    parser.add_argument("--config", default=CONFIG_PATH, help="JSON file with the tracked ids and schedule")
+    parser.add_argument("--once", action="store_true", help="poll the shows that are due and exit")
+    args = parser.parse_args()
+    instrumentation.configure_logging()
+
+    with Tracker(args.config) as tracker:
+        signal.signal(signal.SIGINT, tracker.stop)
+        signal.signal(signal.SIGTERM, tracker.stop)
+        tracker.run(args.once)
+    mal_client.close()
+    instrumentation.report_run()
@@ -1,14 +1,21 @@
+import argparse
 import csv
-import sys
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
 TITLE = 2
 POINTS = 3
+INPUT_DIR = "input"
+OUTPUT_DIR = "output"
+WEEK_FILE = re.compile(r"week-(.+)\.csv$")
 
 def create_dictionary_from_csv(key_value_file):
     """
     The CSV file should be in MAL's weekly Anime Rankings format sorted by Weekly Pts.
     With the header rows being
     Total Ranking, ±LW, Anime Title, Weekly Pts, Total Pts
+    A title listed twice keeps its first (best placed) row, and the duplicate is reported.
     """
     dictionary = {}
 
@@ -22,7 +29,10 @@ def create_dictionary_from_csv(key_value_file):
                 value = (line_number, int(value_str))
             except ValueError:
                 value = (line_number, 0)
-            dictionary.setdefault(key, value)
+            if key in dictionary:
+                print(f"{key_value_file}: '{key}' on line {line_number} is already on line {dictionary[key][0]}, keeping line {dictionary[key][0]}")
+                continue
+            dictionary[key] = value
 
     return dictionary
 
@@ -37,13 +47,86 @@ def write_weeekly_position_csv(dictionary, output_file):
         for key, value in sorted_dict:
             writer.writerow([key, value[0], value[1]])
 
-if __name__ == '__main__':
+def get_week_files(week):
+    """
+    Returns the input and output file of a week.
     """
-    Usage: python FAL-MAL-data-analyzer.py <week>
+    return os.path.join(INPUT_DIR, f"week-{week}.csv"), os.path.join(OUTPUT_DIR, f"week-{week}.csv")
+
+def is_up_to_date(week):
     """
-    week = sys.argv[1]
-    key_value_file = f"input/week-{week}.csv"
-    output_file = f"output/week-{week}.csv"
+    Returns whether the output of a week is newer than its input.
+    """
+    key_value_file, output_file = get_week_files(week)
+    return os.path.exists(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(key_value_file)
+
+def process_week(week):
+    key_value_file, output_file = get_week_files(week)
     result_dictionary = create_dictionary_from_csv(key_value_file)
     write_weeekly_position_csv(result_dictionary, output_file)
-    print(f"CSV file '{output_file}' created successfully.")
+    return output_file
+
+def get_input_weeks():
+    """
+    Returns every week with a file in the input directory, in week order.
+    """
+    weeks = [match.group(1) for match in map(WEEK_FILE.match, os.listdir(INPUT_DIR)) if match]
+    return sorted(weeks, key=lambda week: (not week.isdigit(), int(week) if week.isdigit() else 0, week))
+
+def parse_weeks(weeks):
+    """
+    Expands week arguments: a week (3), a range of weeks (1-12) or all for every file in the input directory.
+    """
+    if not weeks or "all" in weeks:
+        return get_input_weeks()
+    expanded = []
+    for week in weeks:
+        first, _, last = week.partition("-")
+        if last and first.isdigit() and last.isdigit():
+            expanded += [str(number) for number in range(int(first), int(last) + 1)]
+        else:
+            expanded.append(week)
+    return expanded
+
+def process_weeks(weeks, processes=None, force=False):
+    """
+    Writes the weekly position CSV of many weeks in parallel.
+
+    Parameters:
+    weeks: The weeks to process.
+    processes: The number of worker processes. Defaults to the number of CPUs.
+    force: Rewrite weeks whose output is already newer than their input.
+
+    Returns:
+    list: The output files written.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    weeks = [week for week in weeks if force or not is_up_to_date(week)]
+    if len(weeks) <= 1 or processes == 1:
+        return [process_week(week) for week in weeks]
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(process_week, weeks))
+
+if __name__ == '__main__':
+    """
+    Usage: python FAL_get_weekly_position.py <week> [<week> ...]
+    A week can be a number, a range of weeks (1-12) or all for every file in input/.
+    """
+    parser = argparse.ArgumentParser(description="Writes the weekly position CSV of each week.")
+    parser.add_argument("weeks", nargs="*", help="weeks to process, e.g. 3, 1-12 or all (default)")
+    parser.add_argument("--force", action="store_true", help="also rewrite weeks whose output is up to date")
+    parser.add_argument("--processes", type=int, help="number of worker processes")
+    args = parser.parse_args()
+    if not os.path.isdir(INPUT_DIR):
+        parser.error(f"no {INPUT_DIR} directory in {os.getcwd()}, run from the folder holding {INPUT_DIR}/week-<week>.csv")
+    weeks = parse_weeks(args.weeks)
+    if not weeks:
+        parser.error(f"no week-<week>.csv files in {INPUT_DIR}")
+    missing = [week for week in weeks if not os.path.exists(get_week_files(week)[0])]
+    if missing:
+        parser.error(f"no input file for week {', '.join(missing)}")
+    written = process_weeks(weeks, args.processes, args.force)
+    for output_file in written:
+        print(f"CSV file '{output_file}' created successfully.")
+    if len(written) < len(weeks):
+        print(f"{len(weeks) - len(written)} week(s) already up to date.")
@@ -0,0 +1,118 @@
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from FAL_get_weekly_position import OUTPUT_DIR, create_dictionary_from_csv, get_week_files, parse_weeks
+
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, "season.csv")
+DATA_SCRAPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-scraper")
+
+def read_weeks(weeks, processes=None):
+    """
+    Returns the dictionary of each week, read in parallel.
+    """
+    key_value_files = [get_week_files(week)[0] for week in weeks]
+    if len(weeks) <= 1 or processes == 1:
+        return [create_dictionary_from_csv(key_value_file) for key_value_file in key_value_files]
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(create_dictionary_from_csv, key_value_files))
+
+def build_season_matrix(weeks, processes=None):
+    """
+    Merges the weekly rankings into one show by week matrix in a single pass.
+    Each show gets a row the first week it appears in, through a title index.
+
+    Parameters:
+    weeks: The weeks to merge, in order.
+    processes: The number of worker processes reading the weeks. Defaults to the number of CPUs.
+
+    Returns:
+    tuple[list, list]: The titles and, for each title, its (position, weekly points) of every week,
+        None for weeks the show is not ranked in.
+    """
+    titles = []
+    title_index = {}
+    matrix = []
+    for week_number, dictionary in enumerate(read_weeks(weeks, processes)):
+        for title, value in dictionary.items():
+            row = title_index.get(title)
+            if row is None:
+                row = title_index[title] = len(titles)
+                titles.append(title)
+                matrix.append([None] * len(weeks))
+            matrix[row][week_number] = value
+    return titles, matrix
+
+def get_season_rows(weeks, titles, matrix):
+    """
+    Returns the header and one row per show, sorted by total points.
+    For every week a show has its position, weekly points, cumulative points and
+    movement (positions gained since the previous week).
+    """
+    header = ["Anime Title"]
+    for week in weeks:
+        header += [f"W{week} Pos", f"W{week} Pts", f"W{week} Total", f"W{week} ±"]
+    header.append("Total Pts")
+
+    rows = []
+    for title, week_values in zip(titles, matrix):
+        row = [title]
+        total = 0
+        previous_position = None
+        for value in week_values:
+            if value is None:
+                row += ["", "", total, ""]
+                previous_position = None
+                continue
+            position, points = value
+            total += points
+            movement = previous_position - position if previous_position is not None else ""
+            row += [position, points, total, movement]
+            previous_position = position
+        row.append(total)
+        rows.append(row)
+    rows.sort(key=lambda row: (-row[-1], row[0]))
+    return header, rows
+
+def add_mal_ids(header, rows):
+    """
+    Adds the MAL ID of each show after its title, from the title index the scrapers keep
+    in data-scraper. Shows the index does not know get -1.
+    """
+    sys.path.insert(0, DATA_SCRAPER_DIR)
+    from title_index import TitleIndex
+
+    with TitleIndex() as title_index:
+        header.insert(1, "MAL ID")
+        for row in rows:
+            row.insert(1, title_index.lookup(row[0]))
+
+def write_season_csv(header, rows, output_file=OUTPUT_FILE):
+    with open(output_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+if __name__ == '__main__':
+    """
+    Usage: python FAL_season_matrix.py [<week> ...]
+    A week can be a number, a range of weeks (1-12) or all for every file in input/ (default).
+    """
+    parser = argparse.ArgumentParser(description="Merges the weekly rankings into one season CSV.")
+    parser.add_argument("weeks", nargs="*", help="weeks to merge, e.g. 1-12 or all (default)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="the season CSV to write")
+    parser.add_argument("--processes", type=int, help="number of worker processes")
+    parser.add_argument("--mal-ids", action="store_true", help="add the MAL ID of each show from the scrapers' title index")
+    args = parser.parse_args()
+    weeks = parse_weeks(args.weeks)
+    missing = [week for week in weeks if not os.path.exists(get_week_files(week)[0])]
+    if missing:
+        parser.error(f"no input file for week {', '.join(missing)}")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    titles, matrix = build_season_matrix(weeks, args.processes)
+    header, rows = get_season_rows(weeks, titles, matrix)
+    if args.mal_ids:
+        add_mal_ids(header, rows)
+    write_season_csv(header, rows, args.output)
+    print(f"CSV file '{args.output}' created successfully with {len(titles)} shows over {len(weeks)} weeks.")